@@ -1,4 +1,6 @@
-from flask import Flask, jsonify, request
+from functools import wraps
+
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
 import sys
 import os
@@ -6,19 +8,98 @@ import os
 # Add src folder to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
+import borrower_index
+import borrower_profile
+import change_log
+import db_pool
+import fine_cache
+import response_cache
+import search_index
+import streaming
+import suggest
+
 app = Flask(__name__)
 CORS(app)
 
+@app.before_request
+def sync_changes():
+    """Catch up on writes made by other worker processes"""
+    if request.path != '/api/health':
+        change_log.sync()
+
+# Browsers revalidate every time; unchanged data costs a 304 and no work
+CACHE_CONTROL = 'private, no-cache'
+
+def cached_response(view):
+    """Serve GET responses from response_cache with ETag / If-None-Match support"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        # Streamed bodies are never buffered, so there is nothing to store
+        if stream_format():
+            return view(*args, **kwargs)
+        cache_key = response_cache.key(request.path, request.args)
+        version = response_cache.version()
+        hit = response_cache.get(cache_key, version)
+        if hit is not None:
+            tag, body = hit
+        else:
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            body = response.get_data()
+            tag = response_cache.put(cache_key, version, body)
+
+        if request.if_none_match.contains(tag):
+            response_cache.not_modified()
+            response = app.response_class(status=304)
+        else:
+            response = app.response_class(body, mimetype='application/json')
+        response.set_etag(tag)
+        response.headers['Cache-Control'] = CACHE_CONTROL
+        # Accept can switch the same URL to a streamed body
+        response.headers['Vary'] = 'Accept'
+        return response
+    return wrapper
+
+def stream_format():
+    """'ndjson' or 'json' when the client asked for a streamed body, else None"""
+    fmt = request.args.get('stream', '').strip().lower()
+    if fmt in ('ndjson', 'json'):
+        return fmt
+    if fmt in ('1', 'true') or streaming.NDJSON in request.headers.get('Accept', ''):
+        return 'ndjson'
+    return None
+
+def stream_response(key, rows, **fields):
+    """Serialize rows as they are produced, compressed per Accept-Encoding"""
+    fmt = stream_format()
+    if fmt == 'ndjson':
+        pieces, mimetype = streaming.ndjson(rows), streaming.NDJSON
+    else:
+        pieces, mimetype = streaming.json_document(key, rows, **fields), 'application/json'
+
+    encoding = streaming.negotiate(request.headers.get('Accept-Encoding'))
+    try:
+        body = streaming.primed(streaming.encode(pieces, encoding))
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept, Accept-Encoding'
+    return response
+
 try:
     import book_search
     import borrower_management
     import fines
-    # import book_loans
+    import book_loans
     
     print("Loaded your existing Python files:")
     print(f"   - book_search.py")
     print(f"   - borrower_management.py")  
     print(f"   - fines.py")
+    print(f"   - book_loans.py")
     
 except ImportError as e:
     print(f"Couldn't import: {e}")
@@ -28,95 +109,79 @@ except ImportError as e:
 def health_check():
     return jsonify({
         'status': 'healthy',
-        'message': 'Using existing Python files'
+        'message': 'Using existing Python files',
+        'pool': db_pool.get_pool().stats(),
+        'fine_cache': fine_cache.stats(),
+        'profile_cache': borrower_profile.stats(),
+        'response_cache': response_cache.stats()
     })
 
 @app.route('/api/search', methods=['GET'])
+@cached_response
 def search():
-    """Call book_search.py function"""
+    """Paginated substring search over isbn, title and author names"""
     query = request.args.get('q', '').strip()
+    limit = request.args.get('limit', type=int)
+    offset = request.args.get('offset', 0, type=int)
     
-    if not query:
-        return jsonify({'success': True, 'books': [], 'message': 'Enter search term'})
+    # Browsing the whole catalog only makes sense one page at a time
+    if not query and limit is None:
+        return jsonify({'success': True, 'books': [], 'total': 0, 'message': 'Enter search term'})
+    
+    if stream_format():
+        rows = search_index.stream_search(
+            query,
+            mode=request.args.get('mode', 'index'),
+            status=request.args.get('status', ''),
+            limit=limit,
+            offset=offset,
+            after=request.args.get('after') or None)
+        return stream_response('books', rows, limit=limit, offset=offset)
     
     try:
-        import mysql.connector
-
-        db = mysql.connector.connect(
-            host='127.0.0.1',
-            user='root',
-            password='password',
-            database='Library'
-        )
-        cursor = db.cursor()
+        result = search_index.run_search(
+            query,
+            mode=request.args.get('mode', 'index'),
+            status=request.args.get('status', ''),
+            limit=limit,
+            offset=offset,
+            after=request.args.get('after') or None)
         
-        # YOUR EXACT QUERY from book_search.py
-        cursor.execute('SELECT books.isbn AS isbn, books.title AS title, '
-                       'GROUP_CONCAT(authors.name SEPARATOR \', \'), books.borrowed AS borrowed '
-                       'FROM books '
-                       'INNER JOIN book_authors ON books.isbn = book_authors.isbn '
-                       'INNER JOIN authors ON authors.author_id = book_authors.author_id '
-                       'WHERE books.isbn LIKE \'%' + query + '%\' '
-                       '    OR books.title LIKE \'%' + query + '%\' '
-                       '    OR authors.name LIKE \'%' + query + '%\' '
-                       'GROUP BY isbn;')
-        
-        books = []
-        for (isbn, title, name, borrowed) in cursor:
-            books.append({
-                'isbn': isbn,
-                'title': title,
-                'authors': name,
-                'availability': 'IN' if not borrowed else 'OUT'
-            })
-        
-        cursor.close()
-        db.close()
-        
-        return jsonify({
-            'success': True,
-            'books': books,
-            'total': len(books)
-        })
+        return jsonify(dict(success=True, **result))
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/suggest', methods=['GET'])
+def suggest_api():
+    """Typeahead: top title and author completions for a prefix"""
+    try:
+        suggestions = suggest.suggest(request.args.get('q', ''), request.args.get('limit', type=int))
+        return jsonify({'success': True, 'suggestions': suggestions})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/fines', methods=['GET'])
+@cached_response
 def get_fines():
+    """Unpaid fine totals per borrower, served through the fine cache"""
+    card_id = request.args.get('card_id', '').strip()
+    
+    # Full report, optionally including paid fines, straight off the cursor
+    if stream_format() and not card_id:
+        show_paid = request.args.get('paid', '').lower() in ('1', 'true')
+        return stream_response('fines', fines.iter_summaries(show_paid=show_paid))
+    
     try:
-        # Use fines.py logic
-        import mysql.connector
-        from datetime import date
-        
-        db = mysql.connector.connect(
-            host='127.0.0.1',
-            user='root',
-            password='password',
-            database='Library'
-        )
-        cursor = db.cursor(dictionary=True)
-        
-        # YOUR fines.py query for listing fines
-        cursor.execute("""
-            SELECT br.card_id, br.name AS borrower_name,
-                   SUM(f.fine_amt) AS total_fines
-            FROM borrowers br
-            JOIN book_loans bl ON br.card_id = bl.card_id
-            JOIN fines f ON bl.loan_id = f.loan_id
-            WHERE f.paid = 0
-            GROUP BY br.card_id
-            HAVING total_fines > 0
-            ORDER BY br.card_id
-        """)
-        
-        fines = cursor.fetchall()
-        cursor.close()
-        db.close()
+        if card_id:
+            summary = fines.fine_summary(card_id)
+            rows = [summary] if summary else []
+        else:
+            rows = fines.fine_summaries()
         
         return jsonify({
             'success': True,
-            'fines': fines
+            'fines': rows
         })
         
     except Exception as e:
@@ -152,45 +217,69 @@ def add_borrower_api():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
-@app.route('/api/fines', methods=['GET'])
+@app.route('/api/borrowers/search', methods=['GET'])
+@cached_response
+def search_borrowers_api():
+    """Ranked borrower lookup by partial name, address, phone or card id"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'success': True, 'borrowers': [], 'total': 0, 'message': 'Enter search term'})
+
+    try:
+        result = borrower_index.search(query, request.args.get('limit', 20, type=int))
+        return jsonify(dict(success=True, **result))
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/borrowers/import', methods=['POST'])
+def import_borrowers_api():
+    """Bulk import: csv (text/csv or an uploaded file) or jsonl request body"""
+    try:
+        import borrower_import
+
+        # Read line by line; large imports are never held in memory whole
+        upload = request.files.get('file')
+        if upload is not None:
+            stream = upload.stream
+            filename = upload.filename or ''
+        else:
+            stream = request.stream
+            filename = ''
+
+        content_type = request.mimetype or ''
+        if 'json' in content_type or filename.endswith(('.jsonl', '.ndjson')):
+            fmt = 'jsonl'
+        else:
+            fmt = 'csv'
+
+        report = borrower_import.import_stream(stream, fmt)
+
+        return jsonify({
+            "success": True,
+            "summary": report["summary"],
+            "results": report["results"]
+        })
+
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/fines/pay', methods=['POST'])
 def pay_fines():
-    card_id = request.args.get('q', '').strip()
-
-    try:
-        # Use fines.py logic
-        import mysql.connector
-        from datetime import date
-
-        db = mysql.connector.connect(
-            host='127.0.0.1',
-            user='root',
-            password='password',
-            database='Library'
-        )
-        cursor = db.cursor(dictionary=True)
-
-        # YOUR fines.py query for listing fines
-        cursor.execute("""
-            SELECT loan_id, due_date, date_in
-            FROM book_loans
-            WHERE (date_in > due_date)
-            OR (date_in IS NULL AND due_date < CURDATE())
-            """, (card_id,))
-
-        still_out = cursor.fetchall()
-
-        if still_out:
-            print("Cannot pay fines — borrower still has books checked out.")
-            cursor.close()
-            db.close()
-            return
-
-        cursor.execute("""
-            UPDATE fines f
-            JOIN book_loans bl ON f.loan_id = bl.loan_id
-            SET f.paid = 1
-            WHERE bl.card_id = %s AND f.paid = 0
-            """, (card_id,))
+    data = request.get_json(silent=True) or {}
+    card_id = str(data.get('card_id') or request.args.get('q', '')).strip()
+
+    if not card_id:
+        return jsonify({'success': False, 'error': 'card_id is required'}), 400
+
+    try:
+        if not fines.pay_fines(card_id):
+            return jsonify({
+                'success': False,
+                'error': 'Cannot pay fines - borrower still has books checked out.'
+            }), 409
 
         return jsonify({
             'success': True,
@@ -201,6 +290,111 @@ def pay_fines():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def circulation_error(e):
+    """Map book_loans exceptions onto HTTP status codes"""
+    if isinstance(e, ValueError):
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if isinstance(e, LookupError):
+        return jsonify({'success': False, 'error': str(e)}), 404
+    if isinstance(e, RuntimeError):
+        return jsonify({'success': False, 'error': str(e)}), 409
+    return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/checkout', methods=['POST'])
+def checkout_api():
+    data = request.get_json(silent=True) or {}
+
+    try:
+        loan = book_loans.checkout(str(data.get('isbn') or '').strip(), data.get('card_id'))
+        return jsonify({'success': True, 'loan': loan})
+    except Exception as e:
+        return circulation_error(e)
+
+@app.route('/api/checkin', methods=['POST'])
+def checkin_api():
+    data = request.get_json(silent=True) or {}
+
+    try:
+        loan = book_loans.checkin(isbn=str(data.get('isbn') or '').strip() or None,
+                                  loan_id=data.get('loan_id'))
+        return jsonify({'success': True, 'loan': loan})
+    except Exception as e:
+        return circulation_error(e)
+
+@app.route('/api/checkout/batch', methods=['POST'])
+def checkout_batch_api():
+    data = request.get_json(silent=True) or {}
+
+    try:
+        results = book_loans.checkout_many(data.get('card_id'), data.get('isbns') or [])
+        return jsonify({
+            'success': True,
+            'checked_out': sum(1 for r in results if r['success']),
+            'results': results
+        })
+    except Exception as e:
+        return circulation_error(e)
+
+@app.route('/api/checkin/batch', methods=['POST'])
+def checkin_batch_api():
+    data = request.get_json(silent=True) or {}
+
+    try:
+        results = book_loans.checkin_many(data.get('isbns') or [])
+        return jsonify({
+            'success': True,
+            'checked_in': sum(1 for r in results if r['success']),
+            'results': results
+        })
+    except Exception as e:
+        return circulation_error(e)
+
+@app.route('/api/renew', methods=['POST'])
+def renew_api():
+    data = request.get_json(silent=True) or {}
+
+    try:
+        if not data.get('loan_id'):
+            raise ValueError('loan_id is required.')
+        loan = book_loans.renew(data['loan_id'])
+        return jsonify({'success': True, 'loan': loan})
+    except Exception as e:
+        return circulation_error(e)
+
+@app.route('/api/profile/<card_id>', methods=['GET'])
+@cached_response
+def profile_api(card_id):
+    """Borrower, current loans, history and balance in one cached call"""
+    try:
+        return jsonify(dict(success=True, **borrower_profile.get_profile(card_id)))
+    except Exception as e:
+        return circulation_error(e)
+
+@app.route('/api/borrower/<card_id>', methods=['GET'])
+@cached_response
+def borrower_api(card_id):
+    try:
+        profile = borrower_profile.get_profile(card_id)
+        return jsonify({'success': True, 'borrower': profile['borrower'], 'balance': profile['balance']})
+    except Exception as e:
+        return circulation_error(e)
+
+@app.route('/api/loans/<card_id>', methods=['GET'])
+@cached_response
+def loans_api(card_id):
+    try:
+        return jsonify({'success': True, 'loans': borrower_profile.get_profile(card_id)['loans']})
+    except Exception as e:
+        return circulation_error(e)
+
+@app.route('/api/history/<card_id>', methods=['GET'])
+@cached_response
+def history_api(card_id):
+    try:
+        return jsonify({'success': True, 'history': borrower_profile.get_profile(card_id)['history']})
+    except Exception as e:
+        return circulation_error(e)
+
 if __name__ == '__main__':
     print("=" * 50)
     print("Library API - Using YOUR Python Files")
@@ -208,8 +402,20 @@ if __name__ == '__main__':
     print("Your normalized data is already in MySQL!")
     print("This API calls your existing functions.")
     print("\nEndpoints:")
-    print("  GET  /api/search?q=...  - Uses book_search.py logic")
-    print("  GET  /api/fines         - Uses fines.py logic")
+    print("  GET  /api/search?q=...  - In-memory index (mode=sql for LIKE, mode=fulltext for ranked)")
+    print("  GET  /api/suggest?q=... - Title/author completions for the search box")
+    print("  GET  /api/fines         - Cached fine totals (?card_id=...)")
+    print("       ?stream=ndjson|json on /api/search and /api/fines streams rows (gzip/br)")
+    print("  POST /api/fines/pay     - Pay all fines for a card_id")
+    print("  GET  /api/borrowers/search?q=... - Find borrowers by name, address or phone")
+    print("  POST /api/borrowers/import - Bulk borrower import (csv/jsonl)")
+    print("  POST /api/checkout      - Check out {isbn, card_id}")
+    print("  POST /api/checkin       - Check in {isbn} or {loan_id}")
+    print("  POST /api/checkout/batch - Kiosk checkout {card_id, isbns}")
+    print("  POST /api/checkin/batch  - Book-drop checkin {isbns}")
+    print("  POST /api/renew         - Renew {loan_id}")
+    print("  GET  /api/profile/<card_id> - Borrower, loans, history and balance (cached)")
+    print("  GET  /api/borrower|loans|history/<card_id> - Parts of the profile")
     print("  GET  /api/health        - Health check")
     print("=" * 50)
     app.run(debug=True, port=5001)
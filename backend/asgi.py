@@ -0,0 +1,194 @@
+"""
+Asyncio (ASGI) serving mode for the Library API, with MySQL work in a thread pool.
+
+    uvicorn asgi:app --port 5002 --backlog 4096
+"""
+
+import asyncio
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import borrower_management
+import db_pool
+import fine_cache
+import fines
+import search_index
+import streaming
+import suggest
+
+executor = ThreadPoolExecutor(max_workers=db_pool.POOL_SIZE, thread_name_prefix='db')
+
+CORS_HEADERS = [
+    (b'access-control-allow-origin', b'*'),
+    (b'access-control-allow-headers', b'Content-Type, Accept'),
+    (b'access-control-allow-methods', b'GET, POST, OPTIONS'),
+]
+
+
+async def blocking(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, lambda: fn(*args, **kwargs))
+
+
+async def respond(send, body, status=200, headers=()):
+    payload = streaming.dumps(body).encode()
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'),
+                    (b'content-length', str(len(payload)).encode())] + CORS_HEADERS + list(headers),
+    })
+    await send({'type': 'http.response.body', 'body': payload})
+
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+def _int(params, name, default=None):
+    try:
+        return int(params[name][0])
+    except (KeyError, ValueError):
+        return default
+
+
+# ---------- handlers ----------
+
+async def health(params, body):
+    return 200, {
+        'status': 'healthy',
+        'message': 'Using existing Python files',
+        'pool': db_pool.get_pool().stats(),
+        'fine_cache': fine_cache.stats()
+    }
+
+
+async def search(params, body):
+    query = params.get('q', [''])[0].strip()
+    limit = _int(params, 'limit')
+
+    if not query and limit is None:
+        return 200, {'success': True, 'books': [], 'total': 0, 'message': 'Enter search term'}
+
+    kwargs = dict(mode=params.get('mode', ['index'])[0],
+                  status=params.get('status', [''])[0],
+                  limit=limit,
+                  offset=_int(params, 'offset', 0),
+                  after=params.get('after', [None])[0] or None)
+    try:
+        if kwargs['mode'] not in ('sql', 'fulltext') and search_index.is_built():
+            result = search_index.run_search(query, **kwargs)
+        else:
+            result = await blocking(search_index.run_search, query, **kwargs)
+        return 200, dict(success=True, **result)
+    except Exception as e:
+        return 500, {'success': False, 'error': str(e)}
+
+
+async def suggestions(params, body):
+    try:
+        prefix, limit = params.get('q', [''])[0], _int(params, 'limit')
+        if suggest.is_built():
+            rows = suggest.suggest(prefix, limit)
+        else:
+            rows = await blocking(suggest.suggest, prefix, limit)
+        return 200, {'success': True, 'suggestions': rows}
+    except Exception as e:
+        return 500, {'success': False, 'error': str(e)}
+
+
+async def get_fines(params, body):
+    card_id = params.get('card_id', [''])[0].strip()
+    try:
+        if card_id:
+            summary = await blocking(fines.fine_summary, card_id)
+            rows = [summary] if summary else []
+        else:
+            rows = await blocking(fines.fine_summaries)
+        return 200, {'success': True, 'fines': rows}
+    except Exception as e:
+        return 500, {'success': False, 'error': str(e)}
+
+
+async def add_borrower(params, body):
+    try:
+        data = json.loads(body or b'{}')
+        name = data.get("name", "").strip()
+        ssn = data.get("ssn", "").strip()
+        address = data.get("address", "").strip()
+        phone = data.get("phone", "").strip() if data.get("phone") else None
+
+        card_id = await blocking(borrower_management.add_borrower, name, ssn, address, phone)
+        return 200, {
+            "success": True,
+            "message": "Borrower added successfully",
+            "card_id": card_id
+        }
+    except ValueError as e:
+        return 400, {"success": False, "error": str(e)}
+    except RuntimeError as e:
+        return 409, {"success": False, "error": str(e)}
+    except Exception as e:
+        return 500, {"success": False, "error": str(e)}
+
+
+ROUTES = {
+    ('GET', '/api/health'): health,
+    ('GET', '/api/search'): search,
+    ('GET', '/api/suggest'): suggestions,
+    ('GET', '/api/fines'): get_fines,
+    ('POST', '/api/borrowers/add'): add_borrower,
+}
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # Open pooled connections and build the search index before traffic
+            try:
+                await blocking(db_pool.get_pool().warm)
+                await blocking(search_index.get_index)
+                await blocking(suggest.get_index)
+            except Exception as e:
+                print("Warm-up failed:", e)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            db_pool.get_pool().close_all()
+            executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    method = scope['method']
+    if method == 'OPTIONS':
+        await send({'type': 'http.response.start', 'status': 204, 'headers': CORS_HEADERS})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+
+    handler = ROUTES.get((method, scope['path'].rstrip('/') or '/'))
+    if handler is None:
+        await respond(send, {'success': False, 'error': 'Not found'}, 404)
+        return
+
+    params = parse_qs(scope.get('query_string', b'').decode(), keep_blank_values=True)
+    body = await read_body(receive) if method == 'POST' else b''
+    status, payload = await handler(params, body)
+    await respond(send, payload, status)
@@ -3,6 +3,7 @@
 Easy start script for the Library Management System
 """
 
+import argparse
 import subprocess
 import sys
 import os
@@ -57,7 +58,87 @@ def setup_database():
     print("Note: Please run your existing setup scripts manually")
     print("      e.g., python create_tables.py")
 
+def run_production(bind, workers, threads, pidfile=None, timeout=30):
+    """Serve the API under gunicorn's pre-fork server; HUP replaces workers, TERM drains them."""
+    from gunicorn.app.base import BaseApplication
+
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+    import borrower_index
+    import db_pool
+    import search_index
+    import suggest
+
+    def when_ready(server):
+        server.log.info("Library API ready on %s with %d workers x %d threads", bind, workers, threads)
+
+    def post_fork(server, worker):
+        # Never reuse the master's sockets in a worker
+        db_pool.reset()
+
+    def post_worker_init(worker):
+        try:
+            db_pool.get_pool().warm(threads)
+        except Exception as e:
+            worker.log.warning("Connection pool warm-up failed: %s", e)
+
+    class LibraryApplication(BaseApplication):
+        def load_config(self):
+            config = {
+                'bind': bind,
+                'workers': workers,
+                'threads': threads,
+                'worker_class': 'gthread',
+                'preload_app': True,
+                'timeout': timeout,
+                'graceful_timeout': timeout,
+                'keepalive': 5,
+                'pidfile': pidfile,
+                'when_ready': when_ready,
+                'post_fork': post_fork,
+                'post_worker_init': post_worker_init,
+            }
+            for key, value in config.items():
+                if value is not None:
+                    self.cfg.set(key, value)
+
+        def load(self):
+            from app import app
+            try:
+                index = search_index.get_index()
+                print(f"Search index ready: {len(index)} books")
+            except Exception as e:
+                print(f"Search index will be built on first request: {e}")
+            try:
+                print(f"Suggestions ready: {len(suggest.get_index())} titles and authors")
+            except Exception as e:
+                print(f"Suggestions will be built on first request: {e}")
+            try:
+                print(f"Borrower index ready: {len(borrower_index.get_index())} borrowers")
+            except Exception as e:
+                print(f"Borrower index will be built on first request: {e}")
+            db_pool.get_pool().close_all()
+            return app
+
+    LibraryApplication().run()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Start the Library Management System API")
+    parser.add_argument('--production', action='store_true',
+                        help='run under gunicorn (no dependency/MySQL checks, no reloader)')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('LIBRARY_WORKERS', (os.cpu_count() or 1) * 2 + 1)))
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('LIBRARY_THREADS', 4)))
+    parser.add_argument('--pidfile', default=None)
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+
+    if args.production:
+        run_production(f"{args.host}:{args.port}", args.workers, args.threads, args.pidfile)
+        return
+
     print("=" * 50)
     print("LIBRARY MANAGEMENT SYSTEM - SETUP")
     print("=" * 50)
@@ -84,7 +165,7 @@ def main():
     
     # Import and run the app
     from app import app
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    app.run(debug=True, host=args.host, port=args.port)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the search, fines and borrower hot paths.
+
+Seeds Library_bench with the catalog scaled up, times the hot paths and
+index-sensitive queries (with EXPLAIN plans) before and after migrations.py,
+and writes the results to benchmarks/results/. --no-db only times the index.
+
+    python3 benchmarks/bench.py --scale 1 10 100
+    python3 benchmarks/bench.py --no-db --scale 1 10
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+NORMALIZED = os.path.join(ROOT, 'normalized_data')
+RESULTS = os.path.join(ROOT, 'benchmarks', 'results')
+
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, os.path.join(ROOT, 'backend'))
+
+QUERIES = ['a', 'the', 'harry', 'potter', 'tolkien', 'history', '0195', 'king', 'love', 'xyzzy']
+BORROWER_QUERIES = ['smi', 'earl smith', 'gar', '972', '(469) 90', '0100', 'coolidge', 'zzz']
+SEED = 4347
+
+
+# ---------- synthetic data ----------
+
+def scale_catalog(scale, outdir):
+    """Write normalized csvs with `scale` copies of the catalog and borrowers."""
+    paths = {name: os.path.join(outdir, f'{name}.csv')
+             for name in ('books', 'authors', 'book_authors', 'borrowers')}
+
+    def read(name):
+        with open(os.path.join(NORMALIZED, name), newline='', encoding='utf-8') as f:
+            return list(csv.DictReader(f))
+
+    books = read('normalized_book.csv')
+    book_authors = read('normalized_book_authors.csv')
+    borrowers = read('normalized_borrowers.csv')
+
+    # Copy 0 keeps the real isbns; later copies get synthetic S######### ones
+    isbn_map = {}
+    n = 0
+    with open(paths['books'], 'w', newline='', encoding='utf-8') as f:
+        w = csv.writer(f)
+        w.writerow(['Isbn', 'Title'])
+        seen = set()
+        for copy in range(scale):
+            for row in books:
+                if copy == 0:
+                    isbn = row['Isbn']
+                    if isbn in seen:
+                        continue
+                    seen.add(isbn)
+                else:
+                    n += 1
+                    isbn = f'S{n:09d}'
+                isbn_map[(copy, row['Isbn'])] = isbn
+                w.writerow([isbn, row['Title']])
+
+    with open(os.path.join(NORMALIZED, 'normalized_authors.csv'), 'rb') as src, \
+         open(paths['authors'], 'wb') as dst:
+        dst.write(src.read())
+
+    with open(paths['book_authors'], 'w', newline='', encoding='utf-8') as f:
+        w = csv.writer(f)
+        w.writerow(['Author_id', 'Isbn'])
+        pairs = set()
+        for copy in range(scale):
+            for row in book_authors:
+                pair = (row['Author_id'], isbn_map[(copy, row['Isbn'])])
+                if pair not in pairs:
+                    pairs.add(pair)
+                    w.writerow(pair)
+
+    card_ids = []
+    with open(paths['borrowers'], 'w', newline='', encoding='utf-8') as f:
+        w = csv.writer(f)
+        w.writerow(['Card_id', 'Ssn', 'Bname', 'Address', 'Phone'])
+        n = 0
+        for copy in range(scale):
+            for row in borrowers:
+                n += 1
+                w.writerow([n, 100000000 + n, row['Bname'], row['Address'], row['Phone']])
+                card_ids.append(n)
+
+    return paths, list(isbn_map.values()), card_ids
+
+
+def seed_loans(cursor, isbns, card_ids, rng):
+    """Up to three returned loans per borrower, about a third of them late."""
+    today = date.today()
+    loans = []
+    loan_id = 0
+    for card_id in card_ids:
+        for _ in range(rng.randint(0, 3)):
+            loan_id += 1
+            date_out = today - timedelta(days=rng.randint(1, 120))
+            due = date_out + timedelta(days=14)
+            date_in = date_out + timedelta(days=rng.randint(1, 40))
+            # Returned loans no longer hold a loan_count slot
+            loans.append((loan_id, rng.choice(isbns), card_id, date_out, due, date_in, None))
+
+    for i in range(0, len(loans), 5000):
+        cursor.executemany("INSERT INTO book_loans "
+                           "(loan_id, isbn, card_id, date_out, due_date, date_in, loan_count) "
+                           "VALUES (%s, %s, %s, %s, %s, %s, %s)", loans[i:i + 5000])
+    return len(loans)
+
+
+def seed_database(scale, dbname, rng, migrate=True):
+    import mysql.connector
+    import create_tables
+
+    conn = mysql.connector.connect(user='root', password='password')
+    cursor = conn.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS {dbname}")
+    cursor.close()
+    conn.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths, isbns, card_ids = scale_catalog(scale, tmp)
+        start = time.perf_counter()
+        create_tables.createTables(paths['books'], paths['authors'], paths['book_authors'],
+                                   paths['borrowers'], dbname=dbname, migrate=migrate)
+        load_seconds = time.perf_counter() - start
+
+    conn = mysql.connector.connect(user='root', password='password', database=dbname)
+    cursor = conn.cursor()
+    loans = seed_loans(cursor, isbns, card_ids, rng)
+    conn.commit()
+    cursor.close()
+    conn.close()
+    return {'books': len(isbns), 'borrowers': len(card_ids), 'loans': loans,
+            'load_seconds': round(load_seconds, 3)}
+
+
+# ---------- timing ----------
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    k = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[k]
+
+
+def measure(fn, iterations, warmup=2):
+    for _ in range(min(warmup, iterations)):
+        fn()
+    samples = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t) * 1000)
+    total = time.perf_counter() - start
+    return {
+        'iterations': iterations,
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p95_ms': round(percentile(samples, 95), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+        'max_ms': round(max(samples), 3),
+        'ops_per_second': round(iterations / total, 1) if total else None,
+    }
+
+
+def cycle(items):
+    state = {'i': 0}
+
+    def nxt():
+        item = items[state['i'] % len(items)]
+        state['i'] += 1
+        return item
+    return nxt
+
+
+def bench_index(scale, iterations):
+    import borrower_index
+    import search_index
+    import suggest
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths, _, _ = scale_catalog(scale, tmp)
+        start = time.perf_counter()
+        index = search_index.build_from_csv(paths['books'], paths['authors'], paths['book_authors'])
+        build = time.perf_counter() - start
+        start = time.perf_counter()
+        borrowers = borrower_index.build_from_csv(paths['borrowers'])
+        borrowers_build = time.perf_counter() - start
+        start = time.perf_counter()
+        suggestions = suggest.load_from_csv(paths['books'], paths['authors'], paths['book_authors'])
+        suggest_build = time.perf_counter() - start
+
+    query = cycle(QUERIES)
+    borrower_query = cycle(BORROWER_QUERIES)
+    return {
+        'index_build_seconds': round(build, 3),
+        'index.search': measure(lambda: index.search(query()), iterations),
+        'index.page': measure(lambda: index.page(query(), limit=12, offset=24), iterations),
+        'borrower_index_build_seconds': round(borrowers_build, 3),
+        'borrower_index.search': measure(lambda: borrowers.search(borrower_query()), iterations),
+        'suggest_build_seconds': round(suggest_build, 3),
+        'suggest.complete': measure(lambda: suggestions.complete(query()[:4]), iterations),
+    }
+
+
+def bench_database(iterations):
+    import fines
+    import borrower_management
+
+    results = {}
+    try:
+        from app import app
+        client = app.test_client()
+        query = cycle(QUERIES)
+        results['/api/search'] = measure(
+            lambda: client.get('/api/search', query_string={'q': query(), 'limit': 12}), iterations)
+        results['/api/search?mode=sql'] = measure(
+            lambda: client.get('/api/search', query_string={'q': query(), 'mode': 'sql'}),
+            max(1, iterations // 10))
+        results['/api/fines'] = measure(lambda: client.get('/api/fines'), iterations)
+    except ImportError as e:
+        results['api_skipped'] = str(e)
+
+    results['fines.update_fines'] = measure(fines.update_fines, max(1, iterations // 20), warmup=1)
+    with contextlib.redirect_stdout(io.StringIO()):
+        results['fines.list_fines'] = measure(fines.list_fines, iterations)
+
+    ssns = iter(range(900000000, 999999999))
+    results['borrower_management.add_borrower'] = measure(
+        lambda: borrower_management.add_borrower(
+            'Bench Borrower', str(next(ssns)), '1 Bench Way, Richardson, TX', '9725550100'),
+        iterations)
+    return results
+
+
+def bench_schema(iterations):
+    """Time index-sensitive queries, apply migrations.py, then time them again."""
+    import db_pool
+    import migrations
+    import search_index
+
+    conn = db_pool.db()
+    cursor = conn.cursor()
+    cursor.execute("SELECT card_id FROM borrowers ORDER BY card_id LIMIT 100")
+    card_ids = cycle([card_id for (card_id,) in cursor.fetchall()])
+    cursor.execute("SELECT isbn FROM books ORDER BY isbn LIMIT 100")
+    isbn_prefixes = cycle([isbn[:7] for (isbn,) in cursor.fetchall()])
+    cursor.close()
+    conn.close()
+
+    def run(sql, params=()):
+        conn = db_pool.db()
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        cursor.close()
+        conn.close()
+
+    def explain(sql, params=()):
+        conn = db_pool.db()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("EXPLAIN " + sql, params)
+        plan = [{k: row.get(k) for k in ('table', 'type', 'key', 'rows', 'Extra')}
+                for row in cursor.fetchall()]
+        cursor.close()
+        conn.close()
+        return plan
+
+    card_id = card_ids()
+    plans = {
+        'search_sql': (search_index.SEARCH_SQL, ('%harry%',) * 3),
+        'active_loans_by_card': (
+            "SELECT loan_id FROM book_loans WHERE card_id = %s AND date_in IS NULL", (card_id,)),
+        'overdue_scan': (
+            "SELECT loan_id FROM book_loans WHERE date_in IS NULL AND due_date < CURDATE()", ()),
+    }
+
+    query = cycle(QUERIES)
+    probes = {
+        'search_sql': lambda: search_index.search_sql(query()),
+        'search_sql.isbn_prefix': lambda: search_index.search_sql(isbn_prefixes()),
+        'active_loans_by_card': lambda: run(
+            "SELECT loan_id FROM book_loans WHERE card_id = %s AND date_in IS NULL", (card_ids(),)),
+        'overdue_scan': lambda: run(
+            "SELECT loan_id FROM book_loans WHERE date_in IS NULL AND due_date < CURDATE()"),
+    }
+    n = max(1, iterations // 10)
+
+    results = {'before': {name: measure(fn, n) for name, fn in probes.items()},
+               'explain_before': {name: explain(*plan) for name, plan in plans.items()}}
+    start = time.perf_counter()
+    results['migrations'] = migrations.migrate()
+    results['migrate_seconds'] = round(time.perf_counter() - start, 3)
+    probes['search_fulltext'] = lambda: search_index.search_fulltext(query())
+    plans['search_fulltext'] = (search_index.FULLTEXT_SQL, ('harry',) * 4)
+    results['after'] = {name: measure(fn, n) for name, fn in probes.items()}
+    results['explain_after'] = {name: explain(*plan) for name, plan in plans.items()}
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--scale', type=int, nargs='+', default=[1])
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--db', default='Library_bench')
+    parser.add_argument('--no-db', action='store_true', help='only benchmark the in-memory index')
+    parser.add_argument('--out', default=None, help='results file (default: results/<commit>-<time>.json)')
+    args = parser.parse_args()
+
+    # Point db_pool (and everything that uses it) at the benchmark database
+    os.environ['LIBRARY_DB_NAME'] = args.db
+    rng = random.Random(SEED)
+
+    run = {
+        'commit': git_commit(),
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'machine': {
+            'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine(),
+            'cpus': os.cpu_count(),
+        },
+        'iterations': args.iterations,
+        'scales': {},
+    }
+
+    for scale in args.scale:
+        print(f"== scale {scale}x")
+        result = {'index': bench_index(scale, args.iterations)}
+        if not args.no_db:
+            import db_pool
+            import search_index
+            db_pool.get_pool().close_all()
+            search_index._index = None
+            result['seed'] = seed_database(scale, args.db, rng, migrate=False)
+            result['schema'] = bench_schema(args.iterations)
+            result['database'] = bench_database(args.iterations)
+            result['pool'] = db_pool.get_pool().stats()
+        run['scales'][str(scale)] = result
+        print(json.dumps(result, indent=2, default=str))
+
+    os.makedirs(RESULTS, exist_ok=True)
+    out = args.out or os.path.join(
+        RESULTS, '{}-{}.json'.format(run['commit'] or 'local', time.strftime('%Y%m%d-%H%M%S')))
+    with open(out, 'w') as f:
+        json.dump(run, f, indent=2, default=str)
+    print("Results written to", out)
+
+
+if __name__ == '__main__':
+    main()
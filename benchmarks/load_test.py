@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Concurrent HTTP load test for the Library API (stdlib only).
+
+Opens --concurrency connections that each issue requests back to back for
+--duration seconds, then reports throughput and latency percentiles.
+Run it once against the Flask app and once against the ASGI app to
+compare them:
+
+    python3 backend/app.py                             # port 5001
+    cd backend && uvicorn asgi:app --port 5002 --backlog 4096
+    python3 benchmarks/load_test.py --url http://127.0.0.1:5001 --concurrency 500
+    python3 benchmarks/load_test.py --url http://127.0.0.1:5002 --concurrency 500
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from urllib.parse import urlencode, urlsplit
+
+PATHS = [
+    '/api/search?' + urlencode({'q': 'harry', 'limit': 12}),
+    '/api/search?' + urlencode({'q': 'the', 'limit': 12, 'offset': 24}),
+    '/api/search?' + urlencode({'q': 'tolkien', 'limit': 12, 'status': 'available'}),
+    '/api/fines',
+    '/api/health',
+]
+
+
+async def request(host, port, path):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    status_line = await reader.readline()
+    await reader.read()
+    writer.close()
+    return int(status_line.split()[1])
+
+
+async def worker(host, port, paths, deadline, latencies, errors, n):
+    i = n
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            status = await request(host, port, path)
+            if status >= 500:
+                errors.append(status)
+        except OSError as e:
+            errors.append(str(e))
+            await asyncio.sleep(0.01)
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))], 3) if ordered else None
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--url', default='http://127.0.0.1:5001')
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--path', action='append', dest='paths',
+                        help='request this path instead of the default mix (repeatable)')
+    args = parser.parse_args()
+    paths = args.paths or PATHS
+
+    url = urlsplit(args.url)
+    latencies, errors = [], []
+    deadline = time.perf_counter() + args.duration
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(url.hostname, url.port or 80, paths, deadline, latencies, errors, n)
+                           for n in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        'url': args.url,
+        'concurrency': args.concurrency,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -4,6 +4,7 @@
 const CONFIG = {
     API_BASE_URL: 'http://localhost:5001/api',
     DEBOUNCE_DELAY: 300, // milliseconds
+    SUGGEST_LIMIT: 8,
     ITEMS_PER_PAGE: 12
 };
 
@@ -21,6 +22,7 @@ const STATE = {
 // DOM Elements Cache
 const DOM = {
     searchInput: null,
+    suggestionList: null,
     clearSearchBtn: null,
     filterButtons: null,
     resultsGrid: null,
@@ -42,6 +44,7 @@ document.addEventListener('DOMContentLoaded', () => {
 // Cache DOM elements for better performance
 function initializeElements() {
     DOM.searchInput = document.getElementById('searchInput');
+    DOM.suggestionList = document.getElementById('searchSuggestions');
     DOM.clearSearchBtn = document.getElementById('clearSearch');
     DOM.filterButtons = document.querySelectorAll('.filter-btn');
     DOM.resultsGrid = document.getElementById('resultsGrid');
@@ -70,6 +73,8 @@ function setupEventListeners() {
         STATE.currentSearch = event.target.value.trim();
         DOM.clearSearchBtn.style.display = STATE.currentSearch ? 'block' : 'none';
         
+        loadSuggestions(STATE.currentSearch);
+        
         clearTimeout(debounceTimer);
         debounceTimer = setTimeout(() => {
             STATE.currentPage = 1; // Reset to first page on new search
@@ -163,6 +168,41 @@ async function performInitialSearch() {
     }
 }
 
+// Typeahead: cheap enough to ask on every keystroke, only the latest answer is shown
+let suggestController = null;
+async function loadSuggestions(prefix) {
+    if (!DOM.suggestionList) return;
+    if (suggestController) suggestController.abort();
+    if (!prefix) {
+        DOM.suggestionList.innerHTML = '';
+        return;
+    }
+    
+    suggestController = new AbortController();
+    try {
+        const params = new URLSearchParams({ q: prefix, limit: CONFIG.SUGGEST_LIMIT });
+        const response = await fetch(`${CONFIG.API_BASE_URL}/suggest?${params}`, {
+            signal: suggestController.signal
+        });
+        if (!response.ok) return;
+        
+        const data = await response.json();
+        if (!data.success) return;
+        
+        DOM.suggestionList.innerHTML = '';
+        data.suggestions.forEach(suggestion => {
+            const option = document.createElement('option');
+            option.value = suggestion.text;
+            option.label = suggestion.type === 'author' ? 'Author' : 'Title';
+            DOM.suggestionList.appendChild(option);
+        });
+    } catch (error) {
+        if (error.name !== 'AbortError') {
+            console.error('Suggest error:', error);
+        }
+    }
+}
+
 // Main search function - calls Flask API
 async function performSearch() {
     if (STATE.isLoading) return;
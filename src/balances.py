@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# borrower_balances: per-borrower unpaid fine total, kept current by fines.py
+# in the same transaction. Overdue loans are counted live with overdue_loans().
+
+import threading
+
+from db_pool import db as connect
+
+TABLE = """
+    CREATE TABLE IF NOT EXISTS `borrower_balances` (
+      `card_id` int(10) NOT NULL,
+      `unpaid_total` decimal(10,2) NOT NULL,
+      `overdue_loans` int(10) NOT NULL,
+      `last_updated` datetime NOT NULL,
+      PRIMARY KEY (`card_id`)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+RECOMPUTE = """
+    INSERT INTO borrower_balances (card_id, unpaid_total, overdue_loans, last_updated)
+    SELECT bl.card_id,
+           COALESCE(SUM(CASE WHEN f.paid = 0 THEN f.fine_amt END), 0),
+           SUM(bl.date_in IS NULL AND bl.due_date < CURDATE()),
+           NOW()
+    FROM book_loans bl
+    LEFT JOIN fines f ON f.loan_id = bl.loan_id
+    {}
+    GROUP BY bl.card_id
+    ON DUPLICATE KEY UPDATE unpaid_total = VALUES(unpaid_total),
+                            overdue_loans = VALUES(overdue_loans),
+                            last_updated = VALUES(last_updated)
+"""
+
+REFRESH_BATCH = 1000
+
+
+def overdue_loans(alias):
+    """SQL counting the open overdue loans of alias.card_id (card_id, date_in index)."""
+    return ("(SELECT COUNT(*) FROM book_loans ol WHERE ol.card_id = {}.card_id "
+            "AND ol.date_in IS NULL AND ol.due_date < CURDATE())").format(alias)
+
+
+_ready = False
+_ready_lock = threading.Lock()
+
+
+def ensure():
+    """Create (and fill) borrower_balances the first time it is needed."""
+    global _ready
+    if _ready:
+        return
+    with _ready_lock:
+        if _ready:
+            return
+        db = connect()
+        cursor = db.cursor()
+        try:
+            cursor.execute("SHOW TABLES LIKE 'borrower_balances'")
+            exists = cursor.fetchone() is not None
+        finally:
+            cursor.close()
+            db.close()
+        if not exists:
+            rebuild()
+        _ready = True
+
+
+def refresh(cursor, card_ids):
+    """Recompute the given borrowers' rows; runs in the caller's transaction."""
+    card_ids = list(card_ids)
+    for i in range(0, len(card_ids), REFRESH_BATCH):
+        chunk = card_ids[i:i + REFRESH_BATCH]
+        cursor.execute(RECOMPUTE.format(
+            "WHERE bl.card_id IN ({})".format(", ".join(["%s"] * len(chunk)))), chunk)
+
+
+def rebuild():
+    """Recompute every borrower from scratch; returns the row count."""
+    db = connect()
+    cursor = db.cursor()
+    try:
+        cursor.execute(TABLE)
+        cursor.execute("DELETE FROM borrower_balances")
+        cursor.execute(RECOMPUTE.format(""))
+        cursor.execute("SELECT COUNT(*) FROM borrower_balances")
+        count = cursor.fetchone()[0]
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        cursor.close()
+        db.close()
+    return count
+
+
+def get_balance(card_id):
+    ensure()
+    db = connect()
+    cursor = db.cursor(dictionary=True)
+    try:
+        cursor.execute("""
+            SELECT card_id, unpaid_total, {} AS overdue_loans, last_updated
+            FROM borrower_balances bb
+            WHERE card_id = %s
+        """.format(overdue_loans("bb")), (card_id,))
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+        db.close()
+    return row
+
+
+if __name__ == "__main__":
+    print("Rebuilding borrower_balances...")
+    print("Rebuilt", rebuild(), "borrower balances.")
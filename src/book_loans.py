@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+# Checkout / checkin / renew, each one short transaction that locks the
+# borrower, then the book, then the loan. UNIQUE (loan_count, card_id) backs
+# the 3-loan limit.
+
+from datetime import date, timedelta
+
+import balances
+import borrower_profile
+import change_log
+import fine_cache
+import fines
+import migrations
+import response_cache
+import search_index
+from db_pool import db as connect
+
+LOAN_DAYS = 14
+MAX_LOANS = 3
+SLOTS = ('1', '2', '3')
+
+_schema_checked = False
+
+
+def ensure_schema():
+    """Bring older databases in line with create_tables.py (see migrations.py)."""
+    global _schema_checked
+    if _schema_checked:
+        return
+    migrations.migrate()
+    balances.ensure()
+    _schema_checked = True
+
+
+def _lock_borrower(cur, card_id):
+    cur.execute("SELECT card_id FROM borrowers WHERE card_id = %s FOR UPDATE", (card_id,))
+    if cur.fetchone() is None:
+        raise LookupError("No borrower with card_id {}.".format(card_id))
+
+
+def _has_unpaid_fines(cur, card_id):
+    cur.execute("""
+        SELECT 1
+        FROM book_loans bl
+        JOIN fines f ON f.loan_id = bl.loan_id
+        WHERE bl.card_id = %s AND f.paid = 0
+        LIMIT 1
+    """, (card_id,))
+    return cur.fetchone() is not None
+
+
+def _active_slots(cur, card_id):
+    cur.execute("""
+        SELECT loan_count, due_date
+        FROM book_loans
+        WHERE card_id = %s AND date_in IS NULL
+        FOR UPDATE
+    """, (card_id,))
+    return cur.fetchall()
+
+
+def checkout(isbn, card_id):
+    """Lend isbn to card_id; returns the new loan as a dict."""
+    if not isbn or not card_id:
+        raise ValueError("isbn and card_id are required.")
+
+    ensure_schema()
+
+    db = connect()
+    cur = db.cursor()
+    try:
+        _lock_borrower(cur, card_id)
+
+        cur.execute("SELECT borrowed FROM books WHERE isbn = %s FOR UPDATE", (isbn,))
+        row = cur.fetchone()
+        if row is None:
+            raise LookupError("No book with isbn {}.".format(isbn))
+        if row[0]:
+            raise RuntimeError("That book is already checked out.")
+
+        if _has_unpaid_fines(cur, card_id):
+            raise RuntimeError("Borrower has unpaid fines.")
+
+        active = _active_slots(cur, card_id)
+        if len(active) >= MAX_LOANS:
+            raise RuntimeError("Borrower already has {} books checked out.".format(MAX_LOANS))
+        slot = next(s for s in SLOTS if s not in {loan_count for loan_count, _ in active})
+
+        date_out = date.today()
+        due_date = date_out + timedelta(days=LOAN_DAYS)
+        cur.execute("""
+            INSERT INTO book_loans (isbn, card_id, date_out, due_date, date_in, loan_count)
+            VALUES (%s, %s, %s, %s, NULL, %s)
+        """, (isbn, card_id, date_out, due_date, slot))
+        loan_id = cur.lastrowid
+        cur.execute("UPDATE books SET borrowed = TRUE WHERE isbn = %s", (isbn,))
+        change_log.record(cur, [("book", isbn), ("account", card_id)])
+
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        cur.close()
+        db.close()
+
+    search_index.set_borrowed(isbn, True)
+    borrower_profile.invalidate(card_id)
+    response_cache.bump()
+    return {"loan_id": loan_id, "isbn": isbn, "card_id": int(card_id),
+            "date_out": date_out.isoformat(), "due_date": due_date.isoformat()}
+
+
+def checkin(isbn=None, loan_id=None):
+    """Return a book by isbn or loan_id; late returns get their fine right away."""
+    if not isbn and not loan_id:
+        raise ValueError("isbn or loan_id is required.")
+
+    ensure_schema()
+
+    db = connect()
+    cur = db.cursor()
+    try:
+        if loan_id:
+            cur.execute("SELECT loan_id, isbn, card_id FROM book_loans "
+                        "WHERE loan_id = %s AND date_in IS NULL", (loan_id,))
+        else:
+            cur.execute("SELECT loan_id, isbn, card_id FROM book_loans "
+                        "WHERE isbn = %s AND date_in IS NULL", (isbn,))
+        row = cur.fetchone()
+        if row is None:
+            raise LookupError("No open loan for that book.")
+        loan_id, isbn, card_id = row
+
+        # Same lock order as checkout: borrower, book, loan
+        _lock_borrower(cur, card_id)
+        cur.execute("SELECT borrowed FROM books WHERE isbn = %s FOR UPDATE", (isbn,))
+        cur.fetchone()
+        cur.execute("SELECT date_in FROM book_loans WHERE loan_id = %s FOR UPDATE", (loan_id,))
+        if cur.fetchone()[0] is not None:
+            raise RuntimeError("That loan was already checked in.")
+
+        date_in = date.today()
+        cur.execute("UPDATE book_loans SET date_in = %s, loan_count = NULL WHERE loan_id = %s",
+                    (date_in, loan_id))
+        cur.execute("UPDATE books SET borrowed = FALSE WHERE isbn = %s", (isbn,))
+
+        changed = fines._apply_fines(cur, fines.OVERDUE + " AND bl.loan_id = %s", (loan_id,))
+        # _apply_fines refreshes the balance when a fine moved; the overdue
+        # count still drops when it did not
+        if card_id not in changed['card_ids']:
+            balances.refresh(cur, [card_id])
+        change_log.record(cur, [("book", isbn), ("account", card_id)])
+
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        cur.close()
+        db.close()
+
+    search_index.set_borrowed(isbn, False)
+    if changed['inserted'] or changed['updated']:
+        fine_cache.invalidate(card_id)
+    borrower_profile.invalidate(card_id)
+    response_cache.bump()
+    return {"loan_id": loan_id, "isbn": isbn, "card_id": card_id, "date_in": date_in.isoformat()}
+
+
+def renew(loan_id):
+    """Push the due date LOAN_DAYS past today for a loan that is not overdue."""
+    ensure_schema()
+
+    db = connect()
+    cur = db.cursor()
+    try:
+        cur.execute("SELECT card_id FROM book_loans WHERE loan_id = %s AND date_in IS NULL", (loan_id,))
+        row = cur.fetchone()
+        if row is None:
+            raise LookupError("No open loan {}.".format(loan_id))
+        card_id = row[0]
+
+        _lock_borrower(cur, card_id)
+        cur.execute("SELECT due_date, date_in FROM book_loans WHERE loan_id = %s FOR UPDATE", (loan_id,))
+        due_date, date_in = cur.fetchone()
+        if date_in is not None:
+            raise RuntimeError("That loan was already checked in.")
+        if due_date < date.today():
+            raise RuntimeError("Overdue loans cannot be renewed.")
+        if _has_unpaid_fines(cur, card_id):
+            raise RuntimeError("Borrower has unpaid fines.")
+
+        due_date = date.today() + timedelta(days=LOAN_DAYS)
+        cur.execute("UPDATE book_loans SET due_date = %s WHERE loan_id = %s", (due_date, loan_id))
+        change_log.record(cur, [("account", card_id)])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        cur.close()
+        db.close()
+
+    borrower_profile.invalidate(card_id)
+    response_cache.bump()
+    return {"loan_id": int(loan_id), "card_id": card_id, "due_date": due_date.isoformat()}
+
+
+MAX_BATCH = 50
+
+
+def _placeholders(items):
+    return ", ".join(["%s"] * len(items))
+
+
+def checkout_many(card_id, isbns):
+    """Lend several books to one borrower in one transaction; one outcome per isbn."""
+    if not card_id or not isbns:
+        raise ValueError("card_id and at least one isbn are required.")
+    if not isinstance(isbns, (list, tuple)):
+        raise ValueError("isbns must be a list.")
+    isbns = [str(i).strip() for i in isbns]
+    if len(isbns) > MAX_BATCH:
+        raise ValueError("At most {} books per batch.".format(MAX_BATCH))
+
+    ensure_schema()
+
+    results = [{"isbn": isbn} for isbn in isbns]
+    db = connect()
+    cur = db.cursor()
+    try:
+        _lock_borrower(cur, card_id)
+
+        wanted = sorted(set(isbns))
+        cur.execute("SELECT isbn, borrowed FROM books WHERE isbn IN ({}) ORDER BY isbn FOR UPDATE"
+                    .format(_placeholders(wanted)), wanted)
+        borrowed = dict(cur.fetchall())
+
+        blocked = None
+        if _has_unpaid_fines(cur, card_id):
+            blocked = "Borrower has unpaid fines."
+        active = _active_slots(cur, card_id)
+        free = [s for s in SLOTS if s not in {loan_count for loan_count, _ in active}]
+
+        date_out = date.today()
+        due_date = date_out + timedelta(days=LOAN_DAYS)
+        loans = []
+        seen = set()
+        for result in results:
+            isbn = result["isbn"]
+            if blocked:
+                result["error"] = blocked
+            elif isbn in seen:
+                result["error"] = "Scanned twice."
+            elif isbn not in borrowed:
+                result["error"] = "No book with isbn {}.".format(isbn)
+            elif borrowed[isbn]:
+                result["error"] = "That book is already checked out."
+            elif not free:
+                result["error"] = "Borrower already has {} books checked out.".format(MAX_LOANS)
+            else:
+                loans.append((isbn, card_id, date_out, due_date, free.pop(0)))
+            seen.add(isbn)
+
+        if loans:
+            cur.executemany("""
+                INSERT INTO book_loans (isbn, card_id, date_out, due_date, date_in, loan_count)
+                VALUES (%s, %s, %s, %s, NULL, %s)
+            """, loans)
+            lent = [loan[0] for loan in loans]
+            cur.execute("UPDATE books SET borrowed = TRUE WHERE isbn IN ({})".format(_placeholders(lent)), lent)
+            cur.execute("SELECT isbn, loan_id FROM book_loans "
+                        "WHERE card_id = %s AND date_in IS NULL AND isbn IN ({})".format(_placeholders(lent)),
+                        [card_id] + lent)
+            loan_ids = dict(cur.fetchall())
+            change_log.record(cur, [("book", isbn) for isbn in lent] + [("account", card_id)])
+
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        cur.close()
+        db.close()
+
+    if loans:
+        borrower_profile.invalidate(card_id)
+        response_cache.bump()
+    for result in results:
+        if "error" in result:
+            result["success"] = False
+        else:
+            search_index.set_borrowed(result["isbn"], True)
+            result.update(success=True, loan_id=loan_ids[result["isbn"]],
+                          date_out=date_out.isoformat(), due_date=due_date.isoformat())
+    return results
+
+
+def checkin_many(isbns):
+    """Book-drop checkin of several books, possibly from different borrowers."""
+    if not isbns:
+        raise ValueError("At least one isbn is required.")
+    if not isinstance(isbns, (list, tuple)):
+        raise ValueError("isbns must be a list.")
+    isbns = [str(i).strip() for i in isbns]
+    if len(isbns) > MAX_BATCH:
+        raise ValueError("At most {} books per batch.".format(MAX_BATCH))
+
+    ensure_schema()
+
+    results = [{"isbn": isbn} for isbn in isbns]
+    wanted = sorted(set(isbns))
+    date_in = date.today()
+    db = connect()
+    cur = db.cursor()
+    try:
+        cur.execute("SELECT isbn, loan_id, card_id FROM book_loans "
+                    "WHERE date_in IS NULL AND isbn IN ({})".format(_placeholders(wanted)), wanted)
+        open_loans = {isbn: (loan_id, card_id) for isbn, loan_id, card_id in cur.fetchall()}
+
+        returned = {}
+        if open_loans:
+            card_ids = sorted({card_id for _, card_id in open_loans.values()})
+            cur.execute("SELECT card_id FROM borrowers WHERE card_id IN ({}) ORDER BY card_id FOR UPDATE"
+                        .format(_placeholders(card_ids)), card_ids)
+            cur.fetchall()
+            found = sorted(open_loans)
+            cur.execute("SELECT isbn FROM books WHERE isbn IN ({}) ORDER BY isbn FOR UPDATE"
+                        .format(_placeholders(found)), found)
+            cur.fetchall()
+            loan_ids = sorted(loan_id for loan_id, _ in open_loans.values())
+            cur.execute("SELECT loan_id, isbn, card_id FROM book_loans "
+                        "WHERE loan_id IN ({}) AND date_in IS NULL ORDER BY loan_id FOR UPDATE"
+                        .format(_placeholders(loan_ids)), loan_ids)
+            returned = {isbn: (loan_id, card_id) for loan_id, isbn, card_id in cur.fetchall()}
+
+        if returned:
+            loan_ids = [loan_id for loan_id, _ in returned.values()]
+            card_ids = sorted({card_id for _, card_id in returned.values()})
+            cur.execute("UPDATE book_loans SET date_in = %s, loan_count = NULL WHERE loan_id IN ({})"
+                        .format(_placeholders(loan_ids)), [date_in] + loan_ids)
+            back = list(returned)
+            cur.execute("UPDATE books SET borrowed = FALSE WHERE isbn IN ({})".format(_placeholders(back)), back)
+            changed = fines._apply_fines(
+                cur, fines.OVERDUE + " AND bl.loan_id IN ({})".format(_placeholders(loan_ids)), loan_ids)
+            fined = set(changed["card_ids"])
+            balances.refresh(cur, [card_id for card_id in card_ids if card_id not in fined])
+            change_log.record(cur, [("book", isbn) for isbn in back] +
+                                   [("account", card_id) for card_id in card_ids])
+
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        cur.close()
+        db.close()
+
+    if returned:
+        fine_cache.invalidate(*changed["card_ids"])
+        borrower_profile.invalidate(*{card_id for _, card_id in returned.values()})
+        response_cache.bump()
+
+    seen = set()
+    for result in results:
+        isbn = result["isbn"]
+        if isbn in seen:
+            result.update(success=False, error="Scanned twice.")
+        elif isbn in returned:
+            loan_id, card_id = returned[isbn]
+            search_index.set_borrowed(isbn, False)
+            result.update(success=True, loan_id=loan_id, card_id=card_id, date_in=date_in.isoformat())
+        else:
+            result.update(success=False, error="No open loan for that book.")
+        seen.add(isbn)
+    return results
+
+
+if __name__ == "__main__":
+    print("1 = Checkout")
+    print("2 = Checkin")
+    print("3 = Renew")
+
+    ch = input("Choice: ")
+
+    try:
+        if ch == "1":
+            print(checkout(input("ISBN: ").strip(), input("Card ID: ").strip()))
+        elif ch == "2":
+            print(checkin(isbn=input("ISBN: ").strip()))
+        elif ch == "3":
+            print(renew(input("Loan ID: ").strip()))
+        else:
+            print("Invalid choice.")
+    except Exception as e:
+        print("Error:", e)
@@ -1,24 +1,17 @@
-import mysql.connector
 import tkinter
 from tkinter import ttk
 from tkinter import *
 
-def book_search(search):
-
-    db = mysql.connector.connect(user='root',
-        password='password')
-    cursor = db.cursor()
+from db_pool import db as connect
+from search_index import query_sql
 
-    cursor.execute('USE Library;')
+def book_search(search):
 
-    cursor.execute('SELECT books.isbn AS isbn, books.title AS title, GROUP_CONCAT(authors.name SEPARATOR \', \'), books.borrowed AS borrowed '
-                   'FROM books '
-                   'INNER JOIN book_authors ON books.isbn = book_authors.isbn '
-                   'INNER JOIN authors ON authors.author_id = book_authors.author_id '
-                   'WHERE books.isbn LIKE \'%' + search + '%\' '
-                   '    OR books.title LIKE \'%' + search + '%\' '
-                   '    OR authors.name LIKE \'%' + search + '%\' '
-                   'GROUP BY isbn;')
+    db = connect()
+    try:
+        rows = query_sql(db, search)
+    finally:
+        db.close()
 
 
 
@@ -41,7 +34,7 @@ def book_search(search):
 # Insert elements into the listbox
     count = 1
     listbox.insert(END, "NO  ISBN       TITLE                                                                                                                                                                                                    AUTHORS                                            BORROWED")
-    for (isbn, title, name, borrowed) in cursor:
+    for (isbn, title, name, borrowed) in rows:
         listbox.insert(END, "{: <3} {: <10} {: <200} {: <50} {: <1}".format(count, isbn, title, name, borrowed))
         count += 1
 
@@ -55,8 +48,6 @@ def book_search(search):
 # we need to have a vertical view
     scrollbar.config(command = listbox.yview)
 
-    cursor.close()
-
 
 if __name__ == "__main__":
 
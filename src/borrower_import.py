@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# Bulk borrower import from csv or jsonl in the data/borrowers.csv shape,
+# cleaned with the normalize_borrowers rules and inserted in batches.
+
+import csv
+import io
+import json
+import sys
+import time
+
+import mysql.connector
+from mysql.connector import errorcode
+
+import borrower_index
+import borrower_management
+import change_log
+import normalize_borrowers
+import response_cache
+
+BATCH_SIZE = 1000
+
+INSERT = ("INSERT INTO borrowers (ssn, name, card_id, address, phone) "
+          "VALUES (%s, %s, %s, %s, %s)")
+
+
+def read_rows(stream, fmt="csv"):
+    """Yield dict rows from csv (with header) or jsonl; bad jsonl lines come out as ValueError."""
+    if fmt == "jsonl":
+        for line in stream:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    yield ValueError("Invalid JSON: {}".format(e))
+    else:
+        yield from csv.DictReader(stream)
+
+
+def clean_row(n, raw):
+    """(record, None) ready to insert, or (None, error message)."""
+    # Imported patrons get library card ids, the source id is only reported
+    row = normalize_borrowers.normalize_row(dict(raw, ID0000id=raw.get("ID0000id") or str(n)))
+    name, address = row["Bname"], row["Address"]
+    if not name or not row["Ssn"] or not address:
+        return None, "Name, SSN, and address are required."
+    if len(row["Ssn"]) != 9:
+        return None, "SSN must be 9 digits."
+    return {
+        "source_id": raw.get("ID0000id"),
+        "ssn": int(row["Ssn"]),
+        "name": name,
+        "address": address,
+        "phone": row["Phone"][:10] or None,
+    }, None
+
+
+def import_borrowers(rows, batch_size=BATCH_SIZE):
+    """Import an iterable of raw rows; returns {'summary': ..., 'results': [...]}."""
+    results = []
+    seen_ssn = set()
+    batch = []
+    records = {}
+    start = time.perf_counter()
+
+    change_log.ensure()
+    conn = borrower_management.db()
+    try:
+        cur = conn.cursor()
+        for n, raw in enumerate(rows, start=1):
+            if not isinstance(raw, dict):
+                error = str(raw) if isinstance(raw, ValueError) else "Row is not a JSON object."
+                results.append({"row": n, "source_id": None, "status": "invalid", "error": error})
+                continue
+            record, error = clean_row(n, raw)
+            if error:
+                results.append({"row": n, "source_id": raw.get("ID0000id"), "status": "invalid", "error": error})
+                continue
+            if record["ssn"] in seen_ssn:
+                results.append({"row": n, "source_id": record["source_id"], "status": "duplicate",
+                                "error": "SSN appears earlier in this import."})
+                continue
+            seen_ssn.add(record["ssn"])
+            record["row"] = n
+            records[n] = record
+            batch.append(record)
+            if len(batch) >= batch_size:
+                results.extend(_insert_batch(conn, cur, batch))
+                batch = []
+        if batch:
+            results.extend(_insert_batch(conn, cur, batch))
+        cur.close()
+    finally:
+        conn.close()
+
+    results.sort(key=lambda r: r["row"])
+    for r in results:
+        if r["status"] == "created":
+            record = records[r["row"]]
+            borrower_index.add_borrower(r["card_id"], record["name"], record["address"], record["phone"])
+    if any(r["status"] == "created" for r in results):
+        response_cache.bump()
+    elapsed = time.perf_counter() - start
+    summary = {"rows": len(results), "seconds": round(elapsed, 3),
+               "rows_per_second": round(len(results) / elapsed) if elapsed else None}
+    for r in results:
+        summary[r["status"]] = summary.get(r["status"], 0) + 1
+    return {"summary": summary, "results": results}
+
+
+def _insert_batch(conn, cur, batch):
+    # SSNs that already have a card never reach the INSERT
+    ssns = [r["ssn"] for r in batch]
+    cur.execute("SELECT ssn FROM borrowers WHERE ssn IN ({})".format(", ".join(["%s"] * len(ssns))), ssns)
+    existing = {row[0] for row in cur.fetchall()}
+
+    results = []
+    fresh = []
+    for r in batch:
+        if r["ssn"] in existing:
+            results.append({"row": r["row"], "source_id": r["source_id"], "status": "duplicate",
+                            "error": "That SSN already has a card."})
+        else:
+            r["card_id"] = borrower_management.get_next_card_id(conn)
+            fresh.append(r)
+
+    values = [(r["ssn"], r["name"], r["card_id"], r["address"], r["phone"]) for r in fresh]
+    try:
+        cur.executemany(INSERT, values)
+        change_log.record(cur, [("patron", r["card_id"]) for r in fresh])
+        conn.commit()
+    except (mysql.connector.IntegrityError, mysql.connector.DataError):
+        # Someone else took one of these SSNs meanwhile, or a value does not
+        # fit its column: fall back to row by row to find out which
+        conn.rollback()
+        return results + _insert_rows(conn, cur, fresh)
+
+    return results + [{"row": r["row"], "source_id": r["source_id"], "status": "created",
+                       "card_id": r["card_id"]} for r in fresh]
+
+
+def _insert_rows(conn, cur, records):
+    results = []
+    for r in records:
+        try:
+            cur.execute(INSERT, (r["ssn"], r["name"], r["card_id"], r["address"], r["phone"]))
+            results.append({"row": r["row"], "source_id": r["source_id"], "status": "created",
+                            "card_id": r["card_id"]})
+        except mysql.connector.IntegrityError as e:
+            if e.errno == errorcode.ER_DUP_ENTRY:
+                results.append({"row": r["row"], "source_id": r["source_id"], "status": "duplicate",
+                                "error": "That SSN already has a card."})
+            else:
+                results.append({"row": r["row"], "source_id": r["source_id"], "status": "error",
+                                "error": e.msg})
+        except mysql.connector.DataError as e:
+            # e.g. a name longer than borrowers.name allows
+            results.append({"row": r["row"], "source_id": r["source_id"], "status": "error",
+                            "error": e.msg})
+    change_log.record(cur, [("patron", r["card_id"]) for r in results if r["status"] == "created"])
+    conn.commit()
+    return results
+
+
+def import_text(text, fmt="csv", batch_size=BATCH_SIZE):
+    return import_borrowers(read_rows(io.StringIO(text, newline=""), fmt), batch_size)
+
+
+def import_stream(binary, fmt="csv", batch_size=BATCH_SIZE):
+    """Import from a binary stream (an upload or request body) line by line."""
+    text = io.TextIOWrapper(binary, encoding="utf-8", errors="replace", newline="")
+    return import_borrowers(read_rows(text, fmt), batch_size)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: borrower_import.py <borrowers.csv | borrowers.jsonl> [report.jsonl]")
+        sys.exit(1)
+
+    path = sys.argv[1]
+    fmt = "jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv"
+    with open(path, "r", newline="", encoding="utf8") as f:
+        report = import_borrowers(read_rows(f, fmt))
+
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], "w", encoding="utf8") as out:
+            for r in report["results"]:
+                out.write(json.dumps(r) + "\n")
+    else:
+        for r in report["results"]:
+            if r["status"] != "created":
+                print("row {row}: {status} - {error}".format(**r))
+
+    print(json.dumps(report["summary"]))
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+# In-memory patron lookup by partial name, address or phone: a bisect over
+# sorted word lists per field instead of a LIKE '%..%' scan of borrowers.
+
+import bisect
+import csv
+import re
+import threading
+
+from normalize_borrowers import digits, titlecase
+from search_index import fold
+
+# Points for the best way each query term matches a borrower
+SCORES = {
+    "card_id": 100,
+    "name_exact": 30, "name_prefix": 20,
+    "phone_exact": 30, "phone_prefix": 20,
+    "phone_part_exact": 15, "phone_part_prefix": 15,
+    "address_exact": 6, "address_prefix": 4,
+}
+
+PHONE_QUERY = re.compile(r"[\d\s().+-]+")
+
+ALL_FIELDS = ("name", "address", "phone", "phone_part")
+PHONE_FIELDS = ("phone", "phone_part")
+
+# Buckets at most this big are ranked with a plain sort; bigger ones by
+# walking the borrowers in name order until the page is full
+SORT_BUCKET = 1000
+
+# Queries matching at least this many borrowers keep their best rows, like
+# suggest's table for short prefixes; any write clears them
+BROAD_MATCHES = 1000
+BROAD_CACHE_SIZE = 1000
+
+
+def words(s):
+    return re.findall(r"\w+", fold(s))
+
+
+class PrefixMap:
+    """word -> set of card ids, plus the words in sorted order for prefix scans."""
+
+    def __init__(self):
+        self._ids = {}
+        self._words = []
+        self._unsorted = False   # bulk loads append, the next read sorts once
+
+    def add(self, word, card_id):
+        ids = self._ids.get(word)
+        if ids is None:
+            ids = self._ids[word] = set()
+            if self._unsorted or not self._words:
+                self._words.append(word)
+                self._unsorted = True
+            else:
+                bisect.insort(self._words, word)
+        ids.add(card_id)
+
+    def discard(self, word, card_id):
+        ids = self._ids.get(word)
+        if ids is None:
+            return
+        ids.discard(card_id)
+        if not ids:
+            del self._ids[word]
+            self._words.remove(word) if self._unsorted else \
+                self._words.pop(bisect.bisect_left(self._words, word))
+
+    def prefixed(self, prefix):
+        """(word, ids) for every word starting with prefix."""
+        if self._unsorted:
+            self._words.sort()
+            self._unsorted = False
+        i = bisect.bisect_left(self._words, prefix)
+        while i < len(self._words) and self._words[i].startswith(prefix):
+            word = self._words[i]
+            yield word, self._ids[word]
+            i += 1
+
+
+class BorrowerIndex:
+    def __init__(self):
+        self.borrowers = {}   # card_id -> {'card_id', 'name', 'address', 'phone'}
+        self._keys = {}       # card_id -> [(field, word), ...] as indexed
+        self._sort_names = {} # card_id -> folded name, for ranking ties
+        self._by_name = []    # (folded name, card_id) in order, sorted on demand
+        self._unsorted = False
+        self._broad = {}      # query -> (best MAX_RESULTS rows, total)
+        self._maps = {field: PrefixMap() for field in ALL_FIELDS}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.borrowers)
+
+    def add_borrower(self, card_id, name, address, phone=None):
+        card_id = int(card_id)
+        with self._lock:
+            self._broad.clear()
+            if card_id in self.borrowers:
+                self.remove_borrower(card_id)
+            phone = digits(phone)
+            self.borrowers[card_id] = {
+                "card_id": card_id,
+                "name": titlecase(name),
+                "address": address,
+                "phone": phone or None,
+            }
+            keys = [("name", w) for w in set(words(name))]
+            keys += [("address", w) for w in set(words(address))]
+            if phone:
+                # Exchange+line and line too, so "555-01" and "0100" both hit
+                keys += [("phone", phone)]
+                keys += [("phone_part", p) for p in {phone[-7:], phone[-4:]} if p != phone]
+            self._keys[card_id] = keys
+            self._sort_names[card_id] = fold(name)
+            if self._unsorted or not self._by_name:
+                self._by_name.append((fold(name), card_id))
+                self._unsorted = True
+            else:
+                bisect.insort(self._by_name, (fold(name), card_id))
+            for field, word in keys:
+                self._maps[field].add(word, card_id)
+
+    def remove_borrower(self, card_id):
+        with self._lock:
+            if card_id not in self.borrowers:
+                return
+            self._broad.clear()
+            for field, word in self._keys.pop(card_id):
+                self._maps[field].discard(word, card_id)
+            del self.borrowers[card_id]
+            entry = (self._sort_names.pop(card_id), card_id)
+            if self._unsorted:
+                self._by_name.remove(entry)
+            else:
+                self._by_name.pop(bisect.bisect_left(self._by_name, entry))
+
+    def _term_hits(self, term, fields):
+        """(points, ids) for every way one query term matches."""
+        hits = []
+        if term.isdigit() and int(term) in self.borrowers:
+            hits.append((SCORES["card_id"], {int(term)}))
+        for field in fields:
+            for word, ids in self._maps[field].prefixed(term):
+                hits.append((SCORES[field + ("_exact" if word == term else "_prefix")], ids))
+        return hits
+
+    def _match(self, terms, fields):
+        """score -> ids for borrowers matching every term, each term counting its best match."""
+        buckets = None
+        for term in sorted(set(terms), key=len, reverse=True):
+            hits = self._term_hits(term, fields)
+            if buckets is None:
+                buckets = best_scores(hits)
+            else:
+                matched = set().union(*buckets.values())
+                scores = best_scores([(points, ids & matched) for points, ids in hits])
+                # Set operations keep a broad term from costing a Python
+                # loop over every borrower it matches
+                combined = {}
+                for total, ids in buckets.items():
+                    for points, term_ids in scores.items():
+                        both = ids & term_ids
+                        if both:
+                            combined.setdefault(total + points, set()).update(both)
+                buckets = combined
+            if not buckets:
+                return {}
+        return buckets or {}
+
+    def _first_by_name(self, ids, n, first):
+        """Up to n of ids: names starting with first, then alphabetical."""
+        names = self._sort_names
+        if n is None or len(ids) <= SORT_BUCKET:
+            chosen = sorted(ids, key=lambda i: (not names[i].startswith(first), names[i], i))
+            return chosen if n is None else chosen[:n]
+
+        if self._unsorted:
+            self._by_name.sort()
+            self._unsorted = False
+        chosen = []
+        i = bisect.bisect_left(self._by_name, (first,))
+        while i < len(self._by_name) and self._by_name[i][0].startswith(first) and len(chosen) < n:
+            if self._by_name[i][1] in ids:
+                chosen.append(self._by_name[i][1])
+            i += 1
+        for name, card_id in self._by_name:
+            if len(chosen) >= n:
+                break
+            if card_id in ids and not name.startswith(first):
+                chosen.append(card_id)
+        return chosen
+
+    def search(self, query, limit=20):
+        """Best matches first: (rows, total). Every query term has to match."""
+        query = str(query or "").strip()
+        if limit is None or limit > MAX_RESULTS:
+            return self._search(query, limit)
+        key = " ".join(fold(query).split())
+        with self._lock:
+            hit = self._broad.get(key)
+            if hit is None:
+                rows, total = self._search(query, MAX_RESULTS)
+                if total < BROAD_MATCHES:
+                    return rows[:limit], total
+                if len(self._broad) >= BROAD_CACHE_SIZE:
+                    self._broad.clear()
+                hit = self._broad[key] = (rows, total)
+            rows, total = hit
+            return [dict(row) for row in rows[:limit]], total
+
+    def _search(self, query, limit):
+        terms = words(query)
+        with self._lock:
+            buckets = self._match(terms, ALL_FIELDS) if terms else {}
+            if PHONE_QUERY.fullmatch(query) and len(digits(query)) >= 3:
+                # '(972) 868' as one phone number, on top of the digits as
+                # words for addresses and card ids ('5677 Coolidge Street')
+                phone = self._match([digits(query)], PHONE_FIELDS)
+                buckets = best_scores(list(buckets.items()) + list(phone.items()))
+            if not buckets:
+                return [], 0
+
+            # Ties go to names that start with the first term, then alphabetical
+            first = terms[0] if terms else ""
+            rows = []
+            for score in sorted(buckets, reverse=True):
+                want = None if limit is None else limit - len(rows)
+                if want == 0:
+                    break
+                rows += [dict(self.borrowers[i], score=score)
+                         for i in self._first_by_name(buckets[score], want, first)]
+            return rows, sum(map(len, buckets.values()))
+
+
+def best_scores(hits):
+    """(points, ids) pairs -> points -> ids, keeping each id at its best points only."""
+    scores, seen = {}, set()
+    for points, ids in sorted(hits, key=lambda hit: hit[0], reverse=True):
+        ids = ids - seen
+        if ids:
+            scores.setdefault(points, set()).update(ids)
+            seen |= ids
+    return scores
+
+
+def build_from_db(conn):
+    index = BorrowerIndex()
+    cursor = conn.cursor()
+    cursor.execute("SELECT card_id, name, address, phone FROM borrowers")
+    for card_id, name, address, phone in cursor:
+        index.add_borrower(card_id, name, address, phone)
+    cursor.close()
+    return index
+
+
+def build_from_csv(borrowers):
+    index = BorrowerIndex()
+    with open(borrowers, mode='r', newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            card_id = digits(row["Card_id"])
+            if card_id:
+                index.add_borrower(card_id, row["Bname"], row["Address"], row["Phone"])
+    return index
+
+
+MAX_RESULTS = 100
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Process-wide index, built from the Library database on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                import change_log
+                from db_pool import db as connect
+                change_log.start()
+                conn = connect()
+                try:
+                    _index = build_from_db(conn)
+                finally:
+                    conn.close()
+    return _index
+
+
+def add_borrower(card_id, name, address, phone=None):
+    """Index a newly created borrower; a no-op until the index is built."""
+    if _index is not None:
+        _index.add_borrower(card_id, name, address, phone)
+
+
+def refresh_borrowers(card_ids):
+    """Re-read borrowers another process added or changed."""
+    card_ids = [int(card_id) for card_id in card_ids]
+    if _index is None or not card_ids:
+        return
+    from db_pool import db as connect
+    conn = connect()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT card_id, name, address, phone FROM borrowers WHERE card_id IN ({})".format(
+            ", ".join(["%s"] * len(card_ids))), card_ids)
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+    for card_id, name, address, phone in rows:
+        _index.add_borrower(card_id, name, address, phone)
+
+
+def discard():
+    """Drop the index; the next get_index() builds it again from the database."""
+    global _index
+    _index = None
+
+
+def search(query, limit=20):
+    limit = max(1, min(limit or 20, MAX_RESULTS))
+    rows, total = get_index().search(query, limit)
+    return {"borrowers": rows, "total": total, "limit": limit}
+
+
+if __name__ == "__main__":
+    import time
+    index = build_from_csv('../normalized_data/normalized_borrowers.csv')
+    print(f"Indexed {len(index)} borrowers")
+    while True:
+        q = input("Find borrower (blank to quit): ").strip()
+        if not q:
+            break
+        start = time.perf_counter()
+        rows, total = index.search(q, 10)
+        elapsed = (time.perf_counter() - start) * 1000
+        for r in rows:
+            print("  {:>6}  {:<25} {:<10} {}".format(r["card_id"], r["name"], r["phone"] or "", r["address"]))
+        print(f"{total} match(es) in {elapsed:.3f} ms")
@@ -1,15 +1,17 @@
 #!/usr/bin/env python3
+import threading
+
 import mysql.connector
 from mysql.connector import errorcode
 
+import borrower_index
+import change_log
+import db_pool
+import migrations
+import response_cache
 
 def db():
-    return mysql.connector.connect(
-        host="127.0.0.1",
-        user="root",
-        password="password",
-        database="Library"
-    )
+    return db_pool.db()
 
 
 def parse_ssn(raw):
@@ -19,10 +21,65 @@ def parse_ssn(raw):
     return int(digits)
 
 
-def get_next_card_id(cur):
-    cur.execute("SELECT MAX(card_id) FROM borrowers")
-    row = cur.fetchone()
-    return 1 if row[0] is None else int(row[0]) + 1
+CARD_ID_BLOCK = 100
+
+
+class CardIdAllocator:
+    """Hands out card ids from CARD_ID_BLOCK-sized blocks reserved in id_sequences.
+
+    A reservation commits on the connection passed in, so pass one only between transactions.
+    """
+
+    def __init__(self, block_size=CARD_ID_BLOCK):
+        self.block_size = block_size
+        self._next = 0
+        self._limit = 0
+        self._lock = threading.Lock()
+        self._migrated = False
+
+    def next(self, conn=None):
+        with self._lock:
+            if self._next >= self._limit:
+                if conn is None:
+                    with db() as own:
+                        self._next, self._limit = self._reserve(own)
+                else:
+                    self._next, self._limit = self._reserve(conn)
+            card_id = self._next
+            self._next += 1
+            return card_id
+
+    def _reserve(self, conn):
+        if not self._migrated:
+            # id_sequences comes from migrations.py
+            migrations.migrate(conn)
+            self._migrated = True
+        cur = conn.cursor()
+        try:
+            reserve = ("UPDATE id_sequences SET next_id = LAST_INSERT_ID(next_id + %s) "
+                       "WHERE name = 'card_id'")
+            cur.execute(reserve, (self.block_size,))
+            if cur.rowcount == 0:
+                # First use: start the sequence after the existing borrowers
+                cur.execute("INSERT IGNORE INTO id_sequences (name, next_id) "
+                            "SELECT 'card_id', COALESCE(MAX(card_id), 0) + 1 FROM borrowers")
+                cur.execute(reserve, (self.block_size,))
+            cur.execute("SELECT LAST_INSERT_ID()")
+            end = int(cur.fetchone()[0])
+            conn.commit()
+            return end - self.block_size, end
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+
+card_ids = CardIdAllocator()
+
+
+def get_next_card_id(conn=None):
+    return card_ids.next(conn)
 
 
 def add_borrower(name, ssn, address, phone=None):
@@ -35,18 +92,23 @@ def add_borrower(name, ssn, address, phone=None):
         digits = "".join(ch for ch in phone if ch.isdigit())
         phone = digits[:10] if digits else None
 
+    # Allocate before checking out, so a block reservation has the pool to itself
+    card_id = get_next_card_id()
+    change_log.ensure()
+
     conn = db()
     try:
         cur = conn.cursor()
 
-        card_id = get_next_card_id(cur)
-
         cur.execute(
             "INSERT INTO borrowers (ssn, name, card_id, address, phone) "
             "VALUES (%s, %s, %s, %s, %s)",
             (ssn_val, name, card_id, address, phone)
         )
+        change_log.record(cur, [("patron", card_id)])
         conn.commit()
+        borrower_index.add_borrower(card_id, name, address, phone)
+        response_cache.bump()
         return card_id
 
     except mysql.connector.IntegrityError as e:
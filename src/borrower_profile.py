@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# Borrower profile page data (borrower, loans, history, balance), loaded on
+# one connection and cached per card until invalidate().
+
+import os
+import threading
+from datetime import date
+
+import balances
+from db_pool import db as connect
+from fine_cache import MISSING, LRUCache
+
+HISTORY_LIMIT = 200
+
+_cache = LRUCache(max_entries=int(os.environ.get("LIBRARY_PROFILE_CACHE_SIZE", "10000")),
+                  ttl=float(os.environ.get("LIBRARY_PROFILE_CACHE_TTL", "300")))
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+_stats_lock = threading.Lock()
+_generation = 0   # bumped by every invalidation
+
+
+def _count(name, n=1):
+    with _stats_lock:
+        _stats[name] += n
+
+
+def _card_id(card_id):
+    try:
+        return int(str(card_id).strip())
+    except ValueError:
+        raise ValueError("card_id must be a number.")
+
+
+def _key(card_id):
+    card_id = str(card_id).strip()
+    return "profile:{}".format(int(card_id) if card_id.isdigit() else card_id)
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+def _mask_ssn(ssn):
+    digits = str(ssn).zfill(9)
+    return "***-**-" + digits[-4:]
+
+
+def load_profile(card_id):
+    """Read a borrower's profile straight from MySQL (no cache)."""
+    balances.ensure()
+    db = connect()
+    cursor = db.cursor()
+    try:
+        cursor.execute("SELECT card_id, name, ssn, address, phone FROM borrowers WHERE card_id = %s",
+                       (card_id,))
+        row = cursor.fetchone()
+        if row is None:
+            raise LookupError("No borrower with card_id {}.".format(card_id))
+        borrower = {
+            "card_id": row[0],
+            "name": row[1],
+            "ssn": _mask_ssn(row[2]),
+            "address": row[3],
+            "phone": row[4],
+        }
+
+        # Newest first; uses the (card_id, date_in) index on book_loans
+        cursor.execute("""
+            SELECT bl.loan_id, bl.isbn, b.title, GROUP_CONCAT(a.name SEPARATOR ', '),
+                   bl.date_out, bl.due_date, bl.date_in, f.fine_amt, f.paid
+            FROM book_loans bl
+            JOIN books b ON b.isbn = bl.isbn
+            LEFT JOIN book_authors ba ON ba.isbn = bl.isbn
+            LEFT JOIN authors a ON a.author_id = ba.author_id
+            LEFT JOIN fines f ON f.loan_id = bl.loan_id
+            WHERE bl.card_id = %s
+            GROUP BY bl.loan_id
+            ORDER BY bl.date_out DESC, bl.loan_id DESC
+        """, (card_id,))
+        rows = cursor.fetchall()
+
+        cursor.execute("SELECT unpaid_total FROM borrower_balances WHERE card_id = %s", (card_id,))
+        balance = cursor.fetchone() or (0,)
+    finally:
+        cursor.close()
+        db.close()
+
+    loans, history = [], []
+    for loan_id, isbn, title, authors, date_out, due_date, date_in, fine_amt, paid in rows:
+        loan = {
+            "loan_id": loan_id,
+            "isbn": isbn,
+            "title": title,
+            "authors": authors,
+            "date_out": _iso(date_out),
+            "due_date": _iso(due_date),
+            "date_in": _iso(date_in),
+            "fine_amt": float(fine_amt) if fine_amt is not None else None,
+            "paid": bool(paid) if paid is not None else None,
+        }
+        if date_in is None:
+            loans.append(loan)
+        elif len(history) < HISTORY_LIMIT:
+            loan["checkout_date"] = loan["date_out"]
+            loan["return_date"] = loan["date_in"]
+            history.append(loan)
+
+    borrower["total_books"] = len(rows)
+    return {
+        "borrower": borrower,
+        "loans": loans,
+        "history": history,
+        "balance": {
+            "unpaid_total": float(balance[0]),
+            "overdue_loans": sum(1 for row in rows if row[6] is None and row[5] < date.today()),
+        },
+    }
+
+
+def get_profile(card_id):
+    """Cached profile for card_id; raises LookupError for unknown borrowers."""
+    card_id = _card_id(card_id)
+    key = _key(card_id)
+    profile = _cache.get(key, MISSING)
+    if profile is not MISSING:
+        _count("hits")
+        return profile
+    _count("misses")
+    generation = _generation
+    profile = load_profile(card_id)
+    # A write that landed while we were reading may have made this stale
+    if generation == _generation:
+        _cache.set(key, profile)
+    return profile
+
+
+def invalidate(*card_ids):
+    global _generation
+    _generation += 1
+    for card_id in card_ids:
+        _cache.delete(_key(card_id))
+    _count("invalidations", len(card_ids))
+
+
+def invalidate_all():
+    global _generation
+    _generation += 1
+    _cache.clear()
+    _count("invalidations")
+
+
+def stats():
+    with _stats_lock:
+        out = dict(_stats)
+    lookups = out["hits"] + out["misses"]
+    out["hit_rate"] = round(out["hits"] / lookups, 3) if lookups else None
+    out["entries"] = len(_cache)
+    return out
+
+
+if __name__ == "__main__":
+    card_id = input("Card ID: ").strip()
+    try:
+        profile = get_profile(card_id)
+    except (ValueError, LookupError) as e:
+        print(e)
+    else:
+        b = profile["borrower"]
+        print("{} ({}) - {}".format(b["name"], b["card_id"], b["address"]))
+        print("Unpaid fines: ${:.2f}".format(profile["balance"]["unpaid_total"]))
+        print("Checked out:")
+        for loan in profile["loans"]:
+            print("  {} {} (due {})".format(loan["isbn"], loan["title"], loan["due_date"]))
+        print("{} past loans.".format(len(profile["history"])))
@@ -0,0 +1,162 @@
+# Cross-process change log: each worker keeps its own indexes and caches,
+# so writes are logged in data_changes under a gap-free data_version and
+# every process applies them in sync().
+#
+#   ("book", isbn)        availability changed     -> search_index
+#   ("patron", card_id)   borrower added / changed -> borrower_index
+#   ("account", card_id)  loans or fines changed   -> fine_cache, borrower_profile
+#   ("fines", "*")        every borrower's fines   -> fine_cache, borrower_profile
+
+import os
+import threading
+import time
+
+SYNC_INTERVAL = float(os.environ.get("LIBRARY_SYNC_INTERVAL", "1"))
+KEEP_HOURS = 24
+PRUNE_SECONDS = 600
+
+_version = None      # newest version applied in this process
+_failed = False      # the last sync() could not read the log
+_synced_at = 0.0
+_pruned_at = 0.0
+_lock = threading.Lock()
+_ready = False
+
+
+def ensure():
+    """Run migrations.py once per process."""
+    global _ready
+    if not _ready:
+        import migrations
+        migrations.migrate()
+        _ready = True
+
+
+def record(cursor, changes):
+    """Log (kind, item) pairs in the caller's transaction, just before commit."""
+    changes = list(changes)
+    if not changes:
+        return
+    cursor.execute("UPDATE data_version SET version = LAST_INSERT_ID(version + 1) WHERE id = 1")
+    cursor.execute(
+        "INSERT INTO data_changes (version, kind, item, changed_at) VALUES {}".format(
+            ", ".join(["(LAST_INSERT_ID(), %s, %s, NOW())"] * len(changes))),
+        [str(value) for change in changes for value in change])
+
+
+def _current(cursor):
+    cursor.execute("SELECT version FROM data_version WHERE id = 1")
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def start():
+    """Mark the current version as seen before building state from the database."""
+    global _version, _synced_at
+    with _lock:
+        if _version is not None:
+            return
+        try:
+            ensure()
+            from db_pool import db as connect
+            conn = connect()
+            cursor = conn.cursor()
+            try:
+                _version = _current(cursor)
+            finally:
+                cursor.close()
+                conn.close()
+            _synced_at = time.monotonic()
+        except Exception as e:
+            print("change_log: could not read data_version:", e)
+
+
+def version():
+    """Newest version applied here, or None before the first sync and while sync() fails."""
+    return None if _failed else _version
+
+
+def sync():
+    """Apply changes logged since the last sync, at most every SYNC_INTERVAL seconds."""
+    global _version, _failed, _synced_at, _pruned_at
+    if SYNC_INTERVAL and time.monotonic() - _synced_at < SYNC_INTERVAL:
+        return version()
+
+    with _lock:
+        # Another thread may have synced while this one waited
+        if SYNC_INTERVAL and time.monotonic() - _synced_at < SYNC_INTERVAL:
+            return version()
+        try:
+            ensure()
+            from db_pool import db as connect
+            conn = connect()
+            cursor = conn.cursor()
+            try:
+                current = _current(cursor)
+                if _version is None or current == _version:
+                    changes = []
+                elif current < _version:
+                    changes = None   # the database was recreated
+                else:
+                    cursor.execute("SELECT version, kind, item FROM data_changes "
+                                   "WHERE version > %s AND version <= %s ORDER BY version",
+                                   (_version, current))
+                    rows = cursor.fetchall()
+                    # Versions have no gaps, so a missing first one was pruned
+                    if rows and rows[0][0] == _version + 1:
+                        changes = [(kind, item) for _, kind, item in rows]
+                    else:
+                        changes = None
+
+                if time.monotonic() - _pruned_at > PRUNE_SECONDS:
+                    cursor.execute("DELETE FROM data_changes "
+                                   "WHERE changed_at < NOW() - INTERVAL %s HOUR", (KEEP_HOURS,))
+                    conn.commit()
+                    _pruned_at = time.monotonic()
+            finally:
+                cursor.close()
+                conn.close()
+
+            _apply(changes)
+        except Exception as e:
+            print("change_log: sync failed:", e)
+            _failed = True
+            _synced_at = time.monotonic()
+            return None
+
+        _version = current
+        _failed = False
+        _synced_at = time.monotonic()
+        return _version
+
+
+def _apply(changes):
+    """Bring this process's indexes and caches up to date; None means everything."""
+    import borrower_index
+    import borrower_profile
+    import fine_cache
+    import search_index
+
+    if changes is None:
+        fine_cache.invalidate_all()
+        borrower_profile.invalidate_all()
+        search_index.discard()
+        borrower_index.discard()
+        return
+    if not changes:
+        return
+
+    by_kind = {}
+    for kind, item in changes:
+        by_kind.setdefault(kind, set()).add(item)
+
+    if "fines" in by_kind:
+        fine_cache.invalidate_all()
+        borrower_profile.invalidate_all()
+    elif "account" in by_kind:
+        fine_cache.invalidate(*by_kind["account"])
+        borrower_profile.invalidate(*by_kind["account"])
+    if "book" in by_kind:
+        search_index.refresh_borrowed(by_kind["book"])
+    if "patron" in by_kind:
+        borrower_index.refresh_borrowers(by_kind["patron"])
@@ -1,7 +1,91 @@
-import csv, os, mysql.connector
+import csv, os, sys, time, mysql.connector
 from mysql.connector import errorcode
 
-def createTables(books, authors, bookauthors, borrowers):
+import migrations
+
+BATCH_SIZE = 5000
+
+# table, columns, csv file argument, csv -> row converter
+LOADS = [
+    ('books', ('isbn', 'title', 'borrowed'), 'books',
+        lambda row: (row['Isbn'], row['Title'], False)),
+    ('authors', ('name', 'author_id'), 'authors',
+        lambda row: (row['Name'], row['Author_id'])),
+    ('book_authors', ('isbn', 'author_id'), 'bookauthors',
+        lambda row: (row['Isbn'], row['Author_id'])),
+    ('borrowers', ('ssn', 'name', 'card_id', 'address', 'phone'), 'borrowers',
+        lambda row: (row['Ssn'], row['Bname'], row['Card_id'], row['Address'], row['Phone'] or None)),
+]
+
+def batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def load_table(db, cursor, table, columns, path, convert, batch_size=BATCH_SIZE):
+    """executemany() the csv into table in batches; returns rows loaded."""
+    insert = ("INSERT INTO {} ({}) VALUES ({})".format(
+        table, ", ".join("`{}`".format(c) for c in columns), ", ".join(["%s"] * len(columns))))
+    count = 0
+    with open(path, mode='r', newline='', encoding='utf-8') as f:
+        for batch in batches((convert(row) for row in csv.DictReader(f)), batch_size):
+            cursor.executemany(insert, batch)
+            count += len(batch)
+    db.commit()
+    return count
+
+def line_terminator(path):
+    """'\\r\\n' or '\\n', whichever ends the header line of path."""
+    with open(path, mode='rb') as f:
+        return '\\r\\n' if f.readline().endswith(b'\r\n') else '\\n'
+
+def load_table_infile(db, cursor, table, path):
+    """LOAD DATA LOCAL INFILE path; needs allow_local_infile on both ends."""
+    header = {'books': "(@isbn, @title) SET isbn = @isbn, title = @title, borrowed = FALSE",
+              'authors': "(author_id, name)",
+              'book_authors': "(author_id, isbn)",
+              'borrowers': "(card_id, ssn, name, address, @phone) SET phone = NULLIF(@phone, '')"}
+    cursor.execute("LOAD DATA LOCAL INFILE %s INTO TABLE {} "
+                   "CHARACTER SET utf8mb4 "
+                   "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' "
+                   "LINES TERMINATED BY '{}' IGNORE 1 LINES {}".format(
+                       table, line_terminator(path), header[table]),
+                   (os.path.abspath(path),))
+    count = cursor.rowcount
+    db.commit()
+    return count
+
+def bulk_load(db, cursor, books, authors, bookauthors, borrowers, infile=False, batch_size=BATCH_SIZE):
+    """Load the normalized csvs with key checks deferred, reporting rows/s per table."""
+    paths = {'books': books, 'authors': authors, 'bookauthors': bookauthors, 'borrowers': borrowers}
+
+    cursor.execute("SET @BULK_UNIQUE_CHECKS = @@UNIQUE_CHECKS, UNIQUE_CHECKS = 0")
+    cursor.execute("SET @BULK_FOREIGN_KEY_CHECKS = @@FOREIGN_KEY_CHECKS, FOREIGN_KEY_CHECKS = 0")
+
+    stats = {}
+    try:
+        for table, columns, key, convert in LOADS:
+            start = time.perf_counter()
+            if infile:
+                count = load_table_infile(db, cursor, table, paths[key])
+            else:
+                count = load_table(db, cursor, table, columns, paths[key], convert, batch_size)
+            elapsed = time.perf_counter() - start
+            stats[table] = {'rows': count, 'seconds': round(elapsed, 3),
+                            'rows_per_second': round(count / elapsed) if elapsed else None}
+            print("Loaded {} rows into {} in {:.2f}s ({:,.0f} rows/s)".format(
+                count, table, elapsed, count / elapsed if elapsed else 0))
+    finally:
+        cursor.execute("SET UNIQUE_CHECKS = @BULK_UNIQUE_CHECKS")
+        cursor.execute("SET FOREIGN_KEY_CHECKS = @BULK_FOREIGN_KEY_CHECKS")
+    return stats
+
+def createTables(books, authors, bookauthors, borrowers, infile=False, dbname="Library", migrate=True):
 
     TABLES = {}
     TABLES['books'] = (
@@ -43,17 +127,17 @@ def createTables(books, authors, bookauthors, borrowers):
     )
     TABLES['book_loans'] = (
         "CREATE TABLE `book_loans` ("
-        "  `loan_id` int(10) NOT NULL,"
+        "  `loan_id` int(10) NOT NULL AUTO_INCREMENT,"
         "  `isbn` varchar(10) NOT NULL,"
         "  `card_id` int(10) NOT NULL,"
         "  `date_out` date NOT NULL,"
         "  `due_date` date NOT NULL,"
-        "  `date_in` date NOT NULL,"
-        "  `loan_count` enum('1', '2', '3') NOT NULL,"
+        "  `date_in` date,"
+        "  `loan_count` enum('1', '2', '3'),"
         "  PRIMARY KEY (loan_id),"
         "  UNIQUE KEY `loans_per_borrower` (`loan_count`, `card_id`),"
         "  FOREIGN KEY (`card_id`) "
-        "       REFERENCES `borrower` (`card_id`)"
+        "       REFERENCES `borrowers` (`card_id`)"
         ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
     )
     TABLES['fines'] = (
@@ -66,11 +150,19 @@ def createTables(books, authors, bookauthors, borrowers):
         "       REFERENCES `book_loans` (`loan_id`)"
         ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
     )
+    TABLES['borrower_balances'] = (
+        "CREATE TABLE `borrower_balances` ("
+        "  `card_id` int(10) NOT NULL,"
+        "  `unpaid_total` decimal(10,2) NOT NULL,"
+        "  `overdue_loans` int(10) NOT NULL,"
+        "  `last_updated` datetime NOT NULL,"
+        "  PRIMARY KEY (`card_id`)"
+        ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+    )
 
     db = mysql.connector.connect(user='root',
-        password='password')
+        password='password', allow_local_infile=infile)
     cursor = db.cursor()
-    dbname = "Library"
 
     def create_database(cursor):
         try:
@@ -111,59 +203,15 @@ def createTables(books, authors, bookauthors, borrowers):
             print("All tables created")
 
     if created:
-        with open(books, mode='r', newline='', encoding='utf-8') as f:
-
-            reader = csv.DictReader(f)
-
-            add_book = ("INSERT INTO books "
-                        "(`isbn`, `title`, `borrowed`)"
-                        "VALUES (%s, %s, %s)")
-
-            for row in reader:
-                book_data = (row['Isbn'], row['Title'], False)
-                cursor.execute(add_book, book_data)
-            db.commit()
-
-        with open(authors, mode='r', newline='', encoding='utf-8') as f:
-
-            reader = csv.DictReader(f)
+        bulk_load(db, cursor, books, authors, bookauthors, borrowers, infile=infile)
 
-            add_author = ("INSERT INTO authors "
-                        "(`name`, `author_id`)"
-                        "VALUES (%s, %s)")
-
-            for row in reader:
-                author_data = (row['Name'], row['Author_id'])
-                cursor.execute(add_author, author_data)
-            db.commit()
-
-        with open(bookauthors, mode='r', newline='', encoding='utf-8') as f:
-
-            reader = csv.DictReader(f)
-
-            add_bookauthor = ("INSERT INTO book_authors "
-                        "(`isbn`, `author_id`)"
-                        "VALUES (%s, %s)")
-
-            for row in reader:
-                bookauthor_data = (row['Isbn'], row['Author_id'])
-                cursor.execute(add_bookauthor, bookauthor_data)
-            db.commit()
-
-        with open(borrowers, mode='r', newline='', encoding='utf-8') as f:
-
-            reader = csv.DictReader(f)
-
-            add_borrower = ("INSERT INTO borrowers "
-                        "(`ssn`, `name`, `card_id`, `address`, `phone`)"
-                        "VALUES (%s, %s, %s, %s, %s)")
+    cursor.execute("SET FOREIGN_KEY_CHECKS = @OLD_FOREIGN_KEY_CHECKS")
 
-            for row in reader:
-                borrower_data = (row['Ssn'], row['Bname'], row['Card_id'], row['Address'], row['Phone'])
-                cursor.execute(add_borrower, borrower_data)
-            db.commit()
+    # Secondary indexes are built once after the load, not row by row during it
+    if migrate:
+        applied = migrations.migrate(db, verbose=True)
+        print("Applied {} migration(s).".format(len(applied)))
 
-    cursor.execute("SET FOREIGN_KEY_CHECKS = @OLD_FOREIGN_KEY_CHECKS")
     cursor.close()
     db.close()
 
@@ -174,5 +222,5 @@ if __name__ == "__main__":
     book_authors = '../normalized_data/normalized_book_authors.csv'
     borrowers = '../normalized_data/normalized_borrowers.csv'
 
-    # Create Database
-    createTables(books, authors, book_authors, borrowers)
+    # Create Database (pass --infile to load with LOAD DATA LOCAL INFILE)
+    createTables(books, authors, book_authors, borrowers, infile='--infile' in sys.argv)
@@ -0,0 +1,247 @@
+# Shared MySQL connection pool; PooledConnection.close() hands the
+# connection back to the pool instead of closing the socket.
+
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import mysql.connector
+
+DB_CONFIG = {
+    "host": os.environ.get("LIBRARY_DB_HOST", "127.0.0.1"),
+    "user": os.environ.get("LIBRARY_DB_USER", "root"),
+    "password": os.environ.get("LIBRARY_DB_PASSWORD", "password"),
+    "database": os.environ.get("LIBRARY_DB_NAME", "Library"),
+}
+
+POOL_SIZE = int(os.environ.get("LIBRARY_POOL_SIZE", "8"))
+MAX_USES = int(os.environ.get("LIBRARY_POOL_MAX_USES", "1000"))
+CHECKOUT_TIMEOUT = float(os.environ.get("LIBRARY_POOL_TIMEOUT", "10"))
+
+
+class PoolExhausted(RuntimeError):
+    pass
+
+
+class PooledConnection:
+    """Thin proxy around a mysql connection; close() hands it back to the pool."""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self.uses = 0
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def prepared(self, sql):
+        """Server-side prepared cursor for sql, cached per physical connection."""
+        statements = getattr(self._raw, "_library_statements", None)
+        if statements is None:
+            statements = self._raw._library_statements = {}
+        cursor = statements.get(sql)
+        if cursor is None:
+            cursor = statements[sql] = self._raw.cursor(prepared=True)
+            counter = "statements_prepared"
+        else:
+            counter = "statements_reused"
+        if self._pool is not None:
+            with self._pool._lock:
+                self._pool.metrics[counter] += 1
+        return cursor
+
+    def close(self):
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            pool.release(self)
+
+    def discard(self):
+        """Close instead of reusing, e.g. when a streaming client left rows unread."""
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            pool._discard(self._raw)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ConnectionPool:
+    def __init__(self, size=POOL_SIZE, max_uses=MAX_USES, timeout=CHECKOUT_TIMEOUT, **config):
+        self.size = size
+        self.max_uses = max_uses
+        self.timeout = timeout
+        self.config = dict(DB_CONFIG, **config)
+
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+
+        self.metrics = {
+            "checkouts": 0,
+            "created": 0,
+            "recycled": 0,
+            "health_failures": 0,
+            "exhausted": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "statements_prepared": 0,
+            "statements_reused": 0,
+        }
+
+    def _new_raw(self):
+        raw = mysql.connector.connect(**self.config)
+        with self._lock:
+            self.metrics["created"] += 1
+        return raw
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._created -= 1
+
+    def _healthy(self, raw):
+        try:
+            raw.ping(reconnect=False)
+            return True
+        except Exception:
+            with self._lock:
+                self.metrics["health_failures"] += 1
+            return False
+
+    def get(self):
+        """Check out a connection, opening a new one while under the size limit."""
+        start = time.perf_counter()
+        raw = None
+
+        while raw is None:
+            try:
+                raw, uses = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_create = self._created < self.size
+                    if can_create:
+                        self._created += 1
+                if can_create:
+                    try:
+                        raw, uses = self._new_raw(), 0
+                    except Exception:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+                    break
+                remaining = self.timeout - (time.perf_counter() - start)
+                try:
+                    raw, uses = self._idle.get(timeout=max(remaining, 0))
+                except queue.Empty:
+                    with self._lock:
+                        self.metrics["exhausted"] += 1
+                    raise PoolExhausted(
+                        "No database connection available after {:.1f}s "
+                        "(pool size {})".format(self.timeout, self.size))
+
+            if not self._healthy(raw):
+                self._discard(raw)
+                raw = None
+                with self._lock:
+                    self._created += 1
+                try:
+                    raw, uses = self._new_raw(), 0
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+
+        waited = time.perf_counter() - start
+        with self._lock:
+            self.metrics["checkouts"] += 1
+            self.metrics["wait_time_total"] += waited
+            self.metrics["wait_time_max"] = max(self.metrics["wait_time_max"], waited)
+
+        conn = PooledConnection(self, raw)
+        conn.uses = uses + 1
+        return conn
+
+    def release(self, conn):
+        raw = conn._raw
+        # Never hand out a connection with a half-finished transaction.
+        try:
+            if raw.in_transaction:
+                raw.rollback()
+        except Exception:
+            self._discard(raw)
+            return
+
+        if conn.uses >= self.max_uses:
+            with self._lock:
+                self.metrics["recycled"] += 1
+            self._discard(raw)
+            return
+
+        self._idle.put((raw, conn.uses))
+
+    def warm(self, count=None):
+        """Open up to `count` connections ahead of the first request."""
+        conns = [self.get() for _ in range(min(count or self.size, self.size))]
+        for conn in conns:
+            conn.close()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.metrics)
+            stats["size"] = self.size
+            stats["open"] = self._created
+        stats["idle"] = self._idle.qsize()
+        stats["in_use"] = stats["open"] - stats["idle"]
+        stats["wait_time_avg"] = (
+            stats["wait_time_total"] / stats["checkouts"] if stats["checkouts"] else 0.0)
+        return stats
+
+    def close_all(self):
+        while True:
+            try:
+                raw, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(raw)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+
+def reset():
+    """Forget the current pool without touching its sockets (for forked workers)."""
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+
+
+def db():
+    """Pooled replacement for mysql.connector.connect(...) against the Library database."""
+    return get_pool().get()
+
+
+@contextmanager
+def connection():
+    conn = db()
+    try:
+        yield conn
+    finally:
+        conn.close()
@@ -0,0 +1,119 @@
+# Read-through cache for per-borrower fine summaries: an in-process LRU with
+# a TTL by default, or any get / set / delete / clear backend via set_backend().
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+MAX_ENTRIES = int(os.environ.get("LIBRARY_FINE_CACHE_SIZE", "10000"))
+TTL_SECONDS = float(os.environ.get("LIBRARY_FINE_CACHE_TTL", "300"))
+
+MISSING = object()
+
+
+class LRUCache:
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()   # key -> (expires, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_backend = LRUCache()
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+_stats_lock = threading.Lock()
+_generation = 0   # bumped by every invalidation
+
+
+def set_backend(backend):
+    global _backend
+    _backend = backend
+
+
+def _count(name, n=1):
+    with _stats_lock:
+        _stats[name] += n
+
+
+def get_or_load(key, loader):
+    """Cached value for key, calling loader() and caching the result on a miss."""
+    value = _backend.get(key, MISSING)
+    if value is not MISSING:
+        _count("hits")
+        return value
+    _count("misses")
+    generation = _generation
+    value = loader()
+    # A pay or checkin that committed while loader() was reading may have
+    # made this stale; its invalidate() already ran, so do not store it
+    if generation == _generation:
+        _backend.set(key, value)
+    return value
+
+
+def invalidate(*card_ids):
+    """Drop the given borrowers' summaries and the all-borrowers listing."""
+    global _generation
+    _generation += 1
+    for card_id in card_ids:
+        _backend.delete(borrower_key(card_id))
+    _backend.delete(ALL_KEY)
+    _count("invalidations", len(card_ids) + 1)
+
+
+def invalidate_all():
+    global _generation
+    _generation += 1
+    _backend.clear()
+    _count("invalidations")
+
+
+ALL_KEY = "fines:all"
+
+
+def borrower_key(card_id):
+    card_id = str(card_id).strip()
+    return "fines:{}".format(int(card_id) if card_id.isdigit() else card_id)
+
+
+def stats():
+    with _stats_lock:
+        out = dict(_stats)
+    lookups = out["hits"] + out["misses"]
+    out["hit_rate"] = round(out["hits"] / lookups, 3) if lookups else None
+    try:
+        out["entries"] = len(_backend)
+    except TypeError:
+        pass
+    return out
@@ -1,78 +1,351 @@
-import mysql.connector
-from datetime import date
+import sys
+import time
+from datetime import date, datetime, timedelta
 
+import balances
+import borrower_profile
+import change_log
+import fine_cache
+import migrations
+import response_cache
+from db_pool import db as connect
 
-def update_fines():
-    db = mysql.connector.connect(
-        user='root',
-        password='password',
-        host='127.0.0.1',
-        database='Library'
-    )
+
+FINE_PER_DAY = 0.25
+
+OVERDUE = "((bl.date_in > bl.due_date) OR (bl.date_in IS NULL AND bl.due_date < CURDATE()))"
+
+LATE_FINE = "ROUND(DATEDIFF(COALESCE(bl.date_in, CURDATE()), bl.due_date) * %s, 2)"
+
+
+def update_fines(set_based=True):
+    """Recompute fines for every overdue loan; returns rows changed."""
+    if set_based:
+        return update_fines_set_based()
+
+    change_log.ensure()
+    db = connect()
     cursor = db.cursor(dictionary=True)
+    changed = {'inserted': 0, 'updated': 0}
+
+    try:
+        cursor.execute("""
+            SELECT loan_id, due_date, date_in
+            FROM book_loans
+            WHERE (date_in > due_date)
+               OR (date_in IS NULL AND due_date < CURDATE())
+        """)
+        loans = cursor.fetchall()
+
+        for loan in loans:
+            loan_id = loan['loan_id']
+            due = loan['due_date']
+            date_in = loan['date_in']
+
+            if date_in is None:
+                end_date = date.today()
+            else:
+                end_date = date_in
+
+            late_days = (end_date - due).days
+            fine_amt = round(max(0, late_days) * FINE_PER_DAY, 2)
+
+            cursor.execute("SELECT fine_amt, paid FROM fines WHERE loan_id = %s", (loan_id,))
+            existing = cursor.fetchone()
+
+            if existing:
+                if existing['paid'] == 1:
+                    continue
+                if float(existing['fine_amt']) != fine_amt:
+                    cursor.execute("UPDATE fines SET fine_amt = %s WHERE loan_id = %s",
+                                   (fine_amt, loan_id))
+                    changed['updated'] += 1
+            else:
+                cursor.execute("INSERT INTO fines (loan_id, fine_amt, paid) VALUES (%s, %s, 0)",
+                               (loan_id, fine_amt))
+                changed['inserted'] += 1
+
+        if changed['inserted'] or changed['updated']:
+            change_log.record(cursor, [("fines", "*")])
+        db.commit()
+    finally:
+        cursor.close()
+        db.close()
+    if changed['inserted'] or changed['updated']:
+        balances.rebuild()
+        fine_cache.invalidate_all()
+        borrower_profile.invalidate_all()
+        response_cache.bump()
+    return changed
+
+
+def update_fines_set_based():
+    balances.ensure()
+    change_log.ensure()
+    db = connect()
+    cursor = db.cursor()
+
+    try:
+        changed = _apply_fines(cursor, OVERDUE, ())
+        change_log.record(cursor, [("account", card_id) for card_id in changed['card_ids']])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        cursor.close()
+        db.close()
+
+    card_ids = changed.pop('card_ids')
+    fine_cache.invalidate(*card_ids)
+    borrower_profile.invalidate(*card_ids)
+    response_cache.bump()
+    return changed
+
+
+def _apply_fines(cursor, where, params):
+    """Upsert unpaid fines for loans matching `where` (aliased bl); also returns changed card_ids."""
+    cursor.execute(f"""
+        SELECT DISTINCT bl.card_id
+        FROM book_loans bl
+        LEFT JOIN fines f ON f.loan_id = bl.loan_id
+        WHERE {where}
+          AND (f.loan_id IS NULL OR (f.paid = 0 AND f.fine_amt <> {LATE_FINE}))
+    """, tuple(params) + (FINE_PER_DAY,))
+    card_ids = [row[0] for row in cursor.fetchall()]
+    if not card_ids:
+        return {'inserted': 0, 'updated': 0, 'card_ids': []}
+
+    # Unpaid fines whose amount has drifted
+    cursor.execute(f"""
+        UPDATE fines f
+        JOIN book_loans bl ON f.loan_id = bl.loan_id
+        SET f.fine_amt = {LATE_FINE}
+        WHERE f.paid = 0
+          AND {where}
+          AND f.fine_amt <> {LATE_FINE}
+    """, (FINE_PER_DAY,) + tuple(params) + (FINE_PER_DAY,))
+    updated = cursor.rowcount
+
+    # Overdue loans that have no fine row yet
+    cursor.execute(f"""
+        INSERT INTO fines (loan_id, fine_amt, paid)
+        SELECT bl.loan_id, {LATE_FINE}, 0
+        FROM book_loans bl
+        LEFT JOIN fines f ON f.loan_id = bl.loan_id
+        WHERE f.loan_id IS NULL
+          AND {where}
+    """, (FINE_PER_DAY,) + tuple(params))
+    inserted = cursor.rowcount
+
+    balances.refresh(cursor, card_ids)
+
+    return {'inserted': inserted, 'updated': updated, 'card_ids': card_ids}
+
+
+def _count_fines(cursor, where, params):
+    """What _apply_fines would change, without writing anything."""
+    cursor.execute(f"""
+        SELECT SUM(f.loan_id IS NULL),
+               SUM(f.paid = 0 AND f.fine_amt <> {LATE_FINE})
+        FROM book_loans bl
+        LEFT JOIN fines f ON f.loan_id = bl.loan_id
+        WHERE {where}
+    """, (FINE_PER_DAY,) + tuple(params))
+    inserted, updated = cursor.fetchone()
+    return {'inserted': int(inserted or 0), 'updated': int(updated or 0)}
+
+
+# ---------- incremental accrual ----------
+
+# Loans whose fine can still move: overdue and out, or returned late on/after
+# the last run. Anything returned before the watermark was already final.
+CHANGED_SINCE = ("((bl.date_in IS NULL AND bl.due_date < CURDATE()) "
+                 "OR (bl.date_in >= %s AND bl.date_in > bl.due_date))")
+
+
+def get_watermark(cursor):
+    """Date of the last accrual run, or None (fine_watermark comes from migrations.py)."""
+    cursor.execute("SHOW TABLES LIKE 'fine_watermark'")
+    if cursor.fetchone() is None:
+        return None
+    cursor.execute("SELECT last_run FROM fine_watermark WHERE job = 'accrual'")
+    row = cursor.fetchone()
+    return row[0] if row else None
+
 
-    cursor.execute("""
-        SELECT loan_id, due_date, date_in
-        FROM book_loans
-        WHERE (date_in > due_date)
-           OR (date_in IS NULL AND due_date < CURDATE())
-    """)
-    loans = cursor.fetchall()
-
-    for loan in loans:
-        loan_id = loan['loan_id']
-        due = loan['due_date']
-        date_in = loan['date_in']
-
-        if date_in is None:
-            end_date = date.today()
+def accrue_fines(dry_run=False, batch_size=10000, verbose=True):
+    """Bring fines up to date for loans changed since the last accrual run, in batches."""
+    if not dry_run:
+        migrations.migrate()
+    balances.ensure()
+    db = connect()
+    cursor = db.cursor()
+    started = time.perf_counter()
+
+    try:
+        since = get_watermark(cursor)
+        today = date.today()
+        if since is None:
+            where, params = OVERDUE, ()
         else:
-            end_date = date_in
+            where, params = CHANGED_SINCE, (since,)
+
+        cursor.execute(f"SELECT MIN(bl.loan_id), MAX(bl.loan_id), COUNT(*) "
+                       f"FROM book_loans bl WHERE {where}", params)
+        lo, hi, candidates = cursor.fetchone()
+
+        report = {
+            'since': since,
+            'run_date': today,
+            'dry_run': dry_run,
+            'candidates': candidates,
+            'inserted': 0,
+            'updated': 0,
+        }
+
+        if candidates:
+            for start in range(lo, hi + 1, batch_size):
+                batch_where = f"{where} AND bl.loan_id BETWEEN %s AND %s"
+                batch_params = tuple(params) + (start, start + batch_size - 1)
+                if dry_run:
+                    changed = _count_fines(cursor, batch_where, batch_params)
+                else:
+                    changed = _apply_fines(cursor, batch_where, batch_params)
+                    change_log.record(cursor, [("account", card_id) for card_id in changed['card_ids']])
+                    db.commit()
+                    fine_cache.invalidate(*changed['card_ids'])
+                    borrower_profile.invalidate(*changed['card_ids'])
+                    response_cache.bump()
+                report['inserted'] += changed['inserted']
+                report['updated'] += changed['updated']
+
+                if verbose:
+                    done = min(start + batch_size - 1, hi) - lo + 1
+                    elapsed = time.perf_counter() - started
+                    print("  loan_id {}..{}: {:.0%} of id range, {} changed, {:.0f} ids/s".format(
+                        start, min(start + batch_size - 1, hi), done / (hi - lo + 1),
+                        report['inserted'] + report['updated'], done / elapsed if elapsed else 0))
+
+        if not dry_run:
+            cursor.execute("""
+                INSERT INTO fine_watermark (job, last_run) VALUES ('accrual', %s)
+                ON DUPLICATE KEY UPDATE last_run = VALUES(last_run)
+            """, (today,))
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        cursor.close()
+        db.close()
+
+    report['seconds'] = round(time.perf_counter() - started, 3)
+    report['loans_per_second'] = (round(report['candidates'] / report['seconds'])
+                                  if report['seconds'] else None)
+    if verbose:
+        print("Accrual {}since {}: {} candidate loans, {} new fines, {} updated in {}s".format(
+            "(dry run) " if dry_run else "", since or "the beginning", report['candidates'],
+            report['inserted'], report['updated'], report['seconds']))
+    return report
+
 
-        late_days = (end_date - due).days
-        fine_amt = round(max(0, late_days) * 0.25, 2)
+def run_daily(at_hour=1, dry_run=False):
+    """Long-running job: accrue once now, then once a day at `at_hour`:00."""
+    while True:
+        try:
+            accrue_fines(dry_run=dry_run)
+        except Exception as e:
+            print("Accrual failed:", e)
 
-        cursor.execute("SELECT fine_amt, paid FROM fines WHERE loan_id = %s", (loan_id,))
-        existing = cursor.fetchone()
+        now = datetime.now()
+        next_run = (now + timedelta(days=1)).replace(hour=at_hour, minute=0, second=0, microsecond=0)
+        time.sleep(max(60, (next_run - now).total_seconds()))
 
-        if existing:
-            if existing['paid'] == 1:
-                continue
-            if float(existing['fine_amt']) != fine_amt:
-                cursor.execute("UPDATE fines SET fine_amt = %s WHERE loan_id = %s",
-                               (fine_amt, loan_id))
+
+# Unpaid totals come straight from borrower_balances (see balances.py);
+# including paid fines still needs the full aggregation.
+BALANCE_QUERY = """
+    SELECT br.card_id, br.name AS borrower_name,
+        bb.unpaid_total AS total_fines, """ + balances.overdue_loans("bb") + """ AS overdue_loans
+    FROM borrower_balances bb
+    JOIN borrowers br ON br.card_id = bb.card_id
+    WHERE bb.unpaid_total > 0 {}
+    ORDER BY bb.card_id
+"""
+
+SUMMARY_QUERY = """
+    SELECT br.card_id, br.name AS borrower_name,
+        SUM(f.fine_amt) AS total_fines, """ + balances.overdue_loans("br") + """ AS overdue_loans
+    FROM borrowers br
+    JOIN book_loans bl ON br.card_id = bl.card_id
+    JOIN fines f ON bl.loan_id = f.loan_id
+    GROUP BY br.card_id
+    HAVING total_fines > 0
+    ORDER BY br.card_id
+"""
+
+
+def _query_summaries(show_paid=False, card_id=None):
+    if not show_paid:
+        balances.ensure()
+
+    db = connect()
+    cursor = db.cursor(dictionary=True)
+
+    try:
+        if show_paid:
+            cursor.execute(SUMMARY_QUERY)
+        elif card_id is None:
+            cursor.execute(BALANCE_QUERY.format(""))
         else:
-            cursor.execute("INSERT INTO fines (loan_id, fine_amt, paid) VALUES (%s, %s, 0)",
-                           (loan_id, fine_amt))
+            cursor.execute(BALANCE_QUERY.format("AND bb.card_id = %s"), (card_id,))
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        db.close()
+    return rows
 
-    db.commit()
-    cursor.close()
-    db.close()
 
+def iter_summaries(show_paid=False, batch_size=1000):
+    """Fine totals straight off the cursor, for streaming large reports."""
+    if not show_paid:
+        balances.ensure()
 
-def list_fines(show_paid=False):
-    db = mysql.connector.connect(
-        user='root',
-        password='password',
-        host='127.0.0.1',
-        database='Library'
-    )
+    db = connect()
     cursor = db.cursor(dictionary=True)
+    finished = False
+    try:
+        cursor.execute(SUMMARY_QUERY if show_paid else BALANCE_QUERY.format(""))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+        finished = True
+    finally:
+        if finished:
+            cursor.close()
+            db.close()
+        else:
+            db.discard()
+
+
+def fine_summaries():
+    """Unpaid fine totals for every borrower that owes something (cached)."""
+    return fine_cache.get_or_load(fine_cache.ALL_KEY, _query_summaries)
+
 
-    query = """
-        SELECT br.card_id, br.name AS borrower_name,
-            SUM(f.fine_amt) AS total_fines
-        FROM borrowers br
-        JOIN book_loans bl ON br.card_id = bl.card_id
-        JOIN fines f ON bl.loan_id = f.loan_id
-        WHERE (%s = TRUE OR f.paid = 0)
-        GROUP BY br.card_id
-        HAVING total_fines > 0
-        ORDER BY br.card_id
-    """
-
-    cursor.execute(query, (show_paid,))
-    rows = cursor.fetchall()
+def fine_summary(card_id):
+    """Unpaid fine total for one borrower, or None if they owe nothing (cached)."""
+    def load():
+        rows = _query_summaries(card_id=card_id)
+        return rows[0] if rows else None
+    return fine_cache.get_or_load(fine_cache.borrower_key(card_id), load)
+
+
+def list_fines(show_paid=False):
+    rows = _query_summaries(show_paid=True) if show_paid else fine_summaries()
 
     print("CARD_ID     BORROWER NAME                        TOTAL FINES")
     print("--------------------------------------------------------------")
@@ -82,57 +355,62 @@ def list_fines(show_paid=False):
             row['card_id'], row['borrower_name'], row['total_fines']
         ))
 
-    cursor.close()
-    db.close()
-
 
 def pay_fines(card_id):
-    db = mysql.connector.connect(
-        user='root',
-        password='password',
-        host='127.0.0.1',
-        database='Library'
-    )
+    balances.ensure()
+    change_log.ensure()
+    db = connect()
     cursor = db.cursor(dictionary=True)
 
-    cursor.execute("""
-        SELECT loan_id
-        FROM book_loans
-        WHERE card_id = %s AND date_in IS NULL
-    """, (card_id,))
-    still_out = cursor.fetchall()
+    try:
+        cursor.execute("""
+            SELECT loan_id
+            FROM book_loans
+            WHERE card_id = %s AND date_in IS NULL
+        """, (card_id,))
+        still_out = cursor.fetchall()
 
-    if still_out:
-        print("Cannot pay fines — borrower still has books checked out.")
+        if still_out:
+            print("Cannot pay fines — borrower still has books checked out.")
+            return False
+
+        cursor.execute("""
+            UPDATE fines f
+            JOIN book_loans bl ON f.loan_id = bl.loan_id
+            SET f.paid = 1
+            WHERE bl.card_id = %s AND f.paid = 0
+        """, (card_id,))
+        balances.refresh(cursor, [card_id])
+        change_log.record(cursor, [("account", card_id)])
+
+        db.commit()
+    finally:
         cursor.close()
         db.close()
-        return
-
-    cursor.execute("""
-        UPDATE fines f
-        JOIN book_loans bl ON f.loan_id = bl.loan_id
-        SET f.paid = 1
-        WHERE bl.card_id = %s AND f.paid = 0
-    """, (card_id,))
 
-    db.commit()
+    fine_cache.invalidate(card_id)
+    borrower_profile.invalidate(card_id)
+    response_cache.bump()
 
     print("All fines successfully paid for card_id:", card_id)
-
-    cursor.close()
-    db.close()
+    return True
 
 
 if __name__ == "__main__":
+    if "--daily" in sys.argv:
+        run_daily(dry_run="--dry-run" in sys.argv)
+
     print("1. Update fines")
     print("2. Show unpaid fines")
     print("3. Show all fines (including paid)")
     print("4. Pay fines for borrower")
+    print("5. Accrue fines since last run")
+    print("6. Accrue fines since last run (dry run)")
     choice = input("Enter option: ")
 
     if choice == "1":
-        update_fines()
-        print("Fines updated.")
+        changed = update_fines()
+        print("Fines updated: {inserted} new, {updated} changed.".format(**changed))
 
     elif choice == "2":
         list_fines(show_paid=False)
@@ -144,5 +422,11 @@ if __name__ == "__main__":
         card_id = input("Enter card_id: ")
         pay_fines(card_id)
 
+    elif choice == "5":
+        accrue_fines()
+
+    elif choice == "6":
+        accrue_fines(dry_run=True)
+
     else:
         print("Invalid choice.")
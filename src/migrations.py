@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# Versioned schema changes on top of create_tables.py, recorded in
+# schema_migrations. Each step checks information_schema so it is safe to re-run.
+
+import sys
+
+from db_pool import db as connect
+
+LOCK_NAME = "library_schema_migrations"
+LOCK_TIMEOUT = 60
+
+TABLE = """
+    CREATE TABLE IF NOT EXISTS `schema_migrations` (
+      `version` int(10) NOT NULL,
+      `name` varchar(100) NOT NULL,
+      `applied_at` datetime NOT NULL,
+      PRIMARY KEY (`version`)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+
+def _has_index(cursor, table, name):
+    cursor.execute("""
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        LIMIT 1
+    """, (table, name))
+    return cursor.fetchone() is not None
+
+
+def _add_index(cursor, table, name, definition):
+    if not _has_index(cursor, table, name):
+        cursor.execute("ALTER TABLE {} ADD {}".format(table, definition))
+
+
+def _foreign_keys(cursor, table, column):
+    """(constraint name, referenced table) for each foreign key on table.column."""
+    cursor.execute("""
+        SELECT constraint_name, referenced_table_name
+        FROM information_schema.key_column_usage
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+          AND referenced_table_name IS NOT NULL
+    """, (table, column))
+    return [(name, target.lower()) for name, target in cursor.fetchall()]
+
+
+def book_loans_checkin_columns(cursor):
+    """Let book_loans hold open loans and point its card_id key at borrowers."""
+    for name, target in _foreign_keys(cursor, "book_loans", "card_id"):
+        if target != "borrowers":
+            cursor.execute("ALTER TABLE book_loans DROP FOREIGN KEY `{}`".format(name))
+    if not _foreign_keys(cursor, "book_loans", "card_id"):
+        cursor.execute("ALTER TABLE book_loans ADD CONSTRAINT `book_loans_card_id_fk` "
+                       "FOREIGN KEY (`card_id`) REFERENCES `borrowers` (`card_id`)")
+
+    cursor.execute("""
+        SELECT column_name, is_nullable, extra
+        FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = 'book_loans'
+    """)
+    columns = {name.lower(): (nullable, extra) for name, nullable, extra in cursor.fetchall()}
+    if "auto_increment" not in columns["loan_id"][1]:
+        # MySQL will not change a column another table's key points at
+        for name, _ in _foreign_keys(cursor, "fines", "loan_id"):
+            cursor.execute("ALTER TABLE fines DROP FOREIGN KEY `{}`".format(name))
+        cursor.execute("ALTER TABLE book_loans MODIFY `loan_id` int(10) NOT NULL AUTO_INCREMENT")
+    if not _foreign_keys(cursor, "fines", "loan_id"):
+        cursor.execute("ALTER TABLE fines ADD CONSTRAINT `fines_loan_id_fk` "
+                       "FOREIGN KEY (`loan_id`) REFERENCES `book_loans` (`loan_id`)")
+    if columns["date_in"][0] != "YES":
+        cursor.execute("ALTER TABLE book_loans MODIFY `date_in` date NULL")
+    if columns["loan_count"][0] != "YES":
+        cursor.execute("ALTER TABLE book_loans MODIFY `loan_count` enum('1', '2', '3') NULL")
+
+
+def book_authors_keys(cursor):
+    """Primary key on (isbn, author_id), after dropping duplicate rows, plus the reverse index."""
+    if _has_index(cursor, "book_authors", "PRIMARY"):
+        return
+    cursor.execute("""
+        SELECT COUNT(*) FROM (
+            SELECT 1 FROM book_authors GROUP BY isbn, author_id HAVING COUNT(*) > 1
+        ) dup
+    """)
+    if cursor.fetchone()[0]:
+        cursor.execute("CREATE TEMPORARY TABLE book_authors_distinct "
+                       "SELECT DISTINCT isbn, author_id FROM book_authors")
+        cursor.execute("DELETE FROM book_authors")
+        cursor.execute("INSERT INTO book_authors (isbn, author_id) "
+                       "SELECT isbn, author_id FROM book_authors_distinct")
+        cursor.execute("DROP TEMPORARY TABLE book_authors_distinct")
+    cursor.execute("ALTER TABLE book_authors ADD PRIMARY KEY (`isbn`, `author_id`)")
+    _add_index(cursor, "book_authors", "idx_book_authors_author",
+               "KEY `idx_book_authors_author` (`author_id`, `isbn`)")
+
+
+def fulltext_title_name(cursor):
+    _add_index(cursor, "books", "ft_books_title", "FULLTEXT KEY `ft_books_title` (`title`)")
+    _add_index(cursor, "authors", "ft_authors_name", "FULLTEXT KEY `ft_authors_name` (`name`)")
+
+
+def book_loans_indexes(cursor):
+    """Active loans per borrower (date_in IS NULL) and the overdue scan."""
+    _add_index(cursor, "book_loans", "idx_book_loans_card_date_in",
+               "KEY `idx_book_loans_card_date_in` (`card_id`, `date_in`)")
+    _add_index(cursor, "book_loans", "idx_book_loans_due_date",
+               "KEY `idx_book_loans_due_date` (`due_date`)")
+
+
+def fine_watermark(cursor):
+    """Last run date of the incremental fine accrual (fines.accrue_fines)."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS `fine_watermark` (
+          `job` varchar(20) NOT NULL,
+          `last_run` date NOT NULL,
+          PRIMARY KEY (`job`)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+
+
+def id_sequences(cursor):
+    """Card id blocks handed out by borrower_management.CardIdAllocator."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS `id_sequences` (
+          `name` varchar(20) NOT NULL,
+          `next_id` int(10) NOT NULL,
+          PRIMARY KEY (`name`)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+
+
+def data_changes(cursor):
+    """Cross-process change log read by change_log.sync()."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS `data_version` (
+          `id` tinyint NOT NULL,
+          `version` bigint NOT NULL,
+          PRIMARY KEY (`id`)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+    cursor.execute("INSERT IGNORE INTO data_version (id, version) VALUES (1, 0)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS `data_changes` (
+          `version` bigint NOT NULL,
+          `kind` varchar(10) NOT NULL,
+          `item` varchar(20) NOT NULL,
+          `changed_at` datetime NOT NULL,
+          KEY `idx_data_changes_version` (`version`),
+          KEY `idx_data_changes_changed_at` (`changed_at`)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+
+
+# (version, name, function) -- append only, never renumber
+MIGRATIONS = [
+    (1, "book_loans_checkin_columns", book_loans_checkin_columns),
+    (2, "book_authors_keys", book_authors_keys),
+    (3, "fulltext_title_name", fulltext_title_name),
+    (4, "book_loans_indexes", book_loans_indexes),
+    (5, "fine_watermark", fine_watermark),
+    (6, "id_sequences", id_sequences),
+    (7, "data_changes", data_changes),
+]
+
+
+def applied_versions(cursor):
+    cursor.execute(TABLE)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {version for (version,) in cursor.fetchall()}
+
+
+def migrate(db=None, verbose=False):
+    """Apply every pending migration in order; returns the names applied."""
+    own = db is None
+    if own:
+        db = connect()
+    cursor = db.cursor(buffered=True)
+    applied = []
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (LOCK_NAME, LOCK_TIMEOUT))
+        if cursor.fetchone()[0] != 1:
+            raise RuntimeError("Timed out waiting for the schema migration lock.")
+        try:
+            done = applied_versions(cursor)
+            for version, name, apply in MIGRATIONS:
+                if version in done:
+                    continue
+                if verbose:
+                    print("Applying migration {} {}...".format(version, name))
+                apply(cursor)
+                cursor.execute("INSERT INTO schema_migrations (version, name, applied_at) "
+                               "VALUES (%s, %s, NOW())", (version, name))
+                db.commit()
+                applied.append(name)
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+    finally:
+        cursor.close()
+        if own:
+            db.close()
+    return applied
+
+
+def status():
+    db = connect()
+    cursor = db.cursor()
+    try:
+        done = applied_versions(cursor)
+    finally:
+        cursor.close()
+        db.close()
+    return [(version, name, version in done) for version, name, _ in MIGRATIONS]
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["status"]:
+        for version, name, done in status():
+            print("{:>3} {:<30} {}".format(version, name, "applied" if done else "pending"))
+    else:
+        applied = migrate(verbose=True)
+        print("Applied {} migration(s).".format(len(applied)) if applied else "Schema is up to date.")
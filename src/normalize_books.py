@@ -4,6 +4,7 @@
 import csv
 import os
 import re
+import time
 
 """ TODOS:
 Normalize books.csv data into 3NF compliant tables:
@@ -12,57 +13,76 @@ Normalize books.csv data into 3NF compliant tables:
 - normalized_authors.csv (Author_id, Name)
 """
 
-def normalize_books(input_file, book_output, book_authors_output, authors_output):
-    # Ensure the normalized_data directory exists
-    os.makedirs(os.path.dirname(book_output), exist_ok=True)
-    
-    # Read the original books.csv file
+def read_books(input_file):
+    """Yield raw rows from the tab-separated books file one at a time."""
     with open(input_file, mode='r', newline='', encoding='utf-8') as infile:
         reader = csv.DictReader(infile, delimiter='\t')
         print(f"Processing columns: {reader.fieldnames}")
-        
-        books = []
+        yield from reader
+
+def normalize_rows(rows, authors):
+    """Yield (book, book_authors) per input row; new names in `authors` get the next id."""
+    for row in rows:
+        isbn10 = row['ISBN10']
+        title = row['Title']
+        author_field = row['Author'].strip()
+
+        # BOOK table - Only Isbn and Title (3NF compliant)
+        book = {
+            'Isbn': isbn10,
+            'Title': title
+        }
+
+        # Handle multiple authors and empty authors
         book_authors = []
-        authors = {}
-        author_counter = 1
-
-        for row in reader:
-            isbn10 = row['ISBN10']
-            title = row['Title']
-            author_field = row['Author'].strip()
-
-            # BOOK table - Only Isbn and Title (3NF compliant)
-            books.append({
-                'Isbn': isbn10,
-                'Title': title
-            })
-
-            # Handle multiple authors and empty authors
-            if author_field:
-                # Split authors by comma, handling potential whitespace
-                author_names = [name.strip() for name in author_field.split(',')]
-                
-                for author_name in author_names:
-                    if author_name:  # Skip empty author names
-                        # Check if this exact author name already exists
-                        if author_name not in authors:
-                            authors[author_name] = author_counter
-                            author_counter += 1
-                        
-                        # BOOK_AUTHORS - Relationship table
-                        book_authors.append({
-                            'Author_id': authors[author_name],
-                            'Isbn': isbn10
-                        })
-            # If no author, the book will still be in books.csv but no author relationships
-
-    # Write normalized_book.csv (Isbn, Title)
-    with open(book_output, mode='w', newline='', encoding='utf-8') as outfile:
-        fieldnames = ['Isbn', 'Title']
-        writer = csv.DictWriter(outfile, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(books)
-        print(f"Created {book_output} with {len(books)} books")
+        if author_field:
+            # Split authors by comma, handling potential whitespace
+            author_names = [name.strip() for name in author_field.split(',')]
+
+            for author_name in author_names:
+                if author_name:  # Skip empty author names
+                    # Check if this exact author name already exists
+                    if author_name not in authors:
+                        authors[author_name] = len(authors) + 1
+
+                    # BOOK_AUTHORS - Relationship table
+                    book_authors.append({
+                        'Author_id': authors[author_name],
+                        'Isbn': isbn10
+                    })
+        # If no author, the book will still be in books.csv but no author relationships
+
+        yield book, book_authors
+
+def normalize_books(input_file, book_output, book_authors_output, authors_output, progress_every=100000):
+    # Ensure the normalized_data directory exists
+    os.makedirs(os.path.dirname(book_output), exist_ok=True)
+
+    # Stream books straight through to normalized_book.csv and
+    # normalized_book_authors.csv; only the author dictionary stays in memory
+    authors = {}
+    book_count = 0
+    relationship_count = 0
+    start = time.perf_counter()
+
+    with open(book_output, mode='w', newline='', encoding='utf-8') as book_file, \
+         open(book_authors_output, mode='w', newline='', encoding='utf-8') as book_authors_file:
+        book_writer = csv.DictWriter(book_file, fieldnames=['Isbn', 'Title'])
+        book_authors_writer = csv.DictWriter(book_authors_file, fieldnames=['Author_id', 'Isbn'])
+        book_writer.writeheader()
+        book_authors_writer.writeheader()
+
+        for book, book_authors in normalize_rows(read_books(input_file), authors):
+            book_writer.writerow(book)
+            book_authors_writer.writerows(book_authors)
+            book_count += 1
+            relationship_count += len(book_authors)
+
+            if progress_every and book_count % progress_every == 0:
+                elapsed = time.perf_counter() - start
+                print(f"  {book_count:,} books, {book_count / elapsed:,.0f} rows/s")
+
+    print(f"Created {book_output} with {book_count} books")
 
     # Write normalized_authors.csv (Author_id, Name)
     with open(authors_output, mode='w', newline='', encoding='utf-8') as outfile:
@@ -72,13 +92,11 @@ def normalize_books(input_file, book_output, book_authors_output, authors_output
         writer.writerows({'Author_id': author_id, 'Name': name} for name, author_id in authors.items())
         print(f"Created {authors_output} with {len(authors)} authors")
 
-    # Write normalized_book_authors.csv (Author_id, Isbn)
-    with open(book_authors_output, mode='w', newline='', encoding='utf-8') as outfile:
-        fieldnames = ['Author_id', 'Isbn']
-        writer = csv.DictWriter(outfile, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(book_authors)
-        print(f"Created {book_authors_output} with {len(book_authors)} book-author relationships")
+    print(f"Created {book_authors_output} with {relationship_count} book-author relationships")
+
+    elapsed = time.perf_counter() - start
+    print(f"Normalized {book_count:,} books in {elapsed:.2f}s ({book_count / elapsed if elapsed else 0:,.0f} rows/s)")
+    return {'books': book_count, 'authors': len(authors), 'book_authors': relationship_count}
 
 def verify_3nf_compliance():
     # Verify that the normalization achieves 3NF
@@ -12,6 +12,31 @@ def clean(s):
 def titlecase(s):
     return " ".join(w.capitalize() for w in clean(s).split())
 
+def normalize_row(r):
+    """clean one raw borrowers.csv row; None if it has no card id"""
+    cid    = clean(r.get("ID0000id"))
+    ssn    = digits(r.get("ssn"))
+    fname  = clean(r.get("first_name"))
+    lname  = clean(r.get("last_name"))
+    street = clean(r.get("address"))
+    city   = clean(r.get("city"))
+    state  = clean(r.get("state"))[:2].upper()
+    phone  = digits(r.get("phone"))
+
+    if not cid: 
+        return None
+
+    bname   = (f"{titlecase(fname)} {titlecase(lname)}").strip()
+    address = ", ".join([p for p in [street, city, state] if p])
+
+    return {
+        "Card_id": cid,
+        "Ssn": ssn,
+        "Bname": bname,
+        "Address": address,
+        "Phone": phone
+    }
+
 def normalize_borrowers(inp_file, out_file):
     os.makedirs(os.path.dirname(out_file), exist_ok=True)
     with open(inp_file, 'r', newline='', encoding='utf8') as f:
@@ -21,32 +46,16 @@ def normalize_borrowers(inp_file, out_file):
         seen_card, seen_ssn = set(), set()
 
         for r in rdr:
-            cid    = clean(r.get("ID0000id"))
-            ssn    = digits(r.get("ssn"))
-            fname  = clean(r.get("first_name"))
-            lname  = clean(r.get("last_name"))
-            street = clean(r.get("address"))
-            city   = clean(r.get("city"))
-            state  = clean(r.get("state"))[:2].upper()
-            phone  = digits(r.get("phone"))
-
-            if not cid: 
+            row = normalize_row(r)
+            if row is None:
                 continue
+            cid, ssn = row["Card_id"], row["Ssn"]
             if cid in seen_card: 
                 continue
             if ssn and ssn in seen_ssn:
                 continue
 
-            bname   = (f"{titlecase(fname)} {titlecase(lname)}").strip()
-            address = ", ".join([p for p in [street, city, state] if p])
-
-            out_rows.append({
-                "Card_id": cid,
-                "Ssn": ssn,
-                "Bname": bname,
-                "Address": address,
-                "Phone": phone
-            })
+            out_rows.append(row)
 
             seen_card.add(cid)
             if ssn:
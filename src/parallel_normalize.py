@@ -0,0 +1,171 @@
+# Multi-process normalize_books / normalize_borrowers: byte ranges are
+# normalized in workers and merged in file order, matching the serial output.
+
+import csv
+import io
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import normalize_books
+import normalize_borrowers
+
+CHUNK_BYTES = 8 * 1024 * 1024
+
+
+def byte_ranges(path, chunk_bytes=CHUNK_BYTES):
+    """(header line, [(start, end), ...]) with every range ending on a newline."""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        header = f.readline()
+        ranges = []
+        start = f.tell()
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            if f.tell() < size:
+                f.readline()
+            end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return header, ranges
+
+
+def read_chunk(path, start, end, header, encoding, delimiter):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    fieldnames = next(csv.reader([header.decode(encoding)], delimiter=delimiter))
+    return csv.DictReader(io.StringIO(data.decode(encoding), newline=''),
+                          fieldnames=fieldnames, delimiter=delimiter)
+
+
+# ---------- books ----------
+
+def _books_worker(args):
+    path, start, end, header, tmpdir, n = args
+    rows = read_chunk(path, start, end, header, 'utf-8', '\t')
+
+    # Chunk-local author ids, numbered from 1 in first-seen order
+    local = {}
+    book_path = os.path.join(tmpdir, f"book.{n}")
+    rel_path = os.path.join(tmpdir, f"rel.{n}")
+    with open(book_path, 'w', newline='', encoding='utf-8') as bf, \
+         open(rel_path, 'w', newline='', encoding='utf-8') as rf:
+        book_writer = csv.DictWriter(bf, fieldnames=['Isbn', 'Title'])
+        rel_writer = csv.writer(rf)
+        count = 0
+        for book, book_authors in normalize_books.normalize_rows(rows, local):
+            book_writer.writerow(book)
+            rel_writer.writerows((ba['Author_id'], ba['Isbn']) for ba in book_authors)
+            count += 1
+    return book_path, rel_path, list(local), count
+
+
+def normalize_books_parallel(input_file, book_output, book_authors_output, authors_output,
+                             workers=None, chunk_bytes=CHUNK_BYTES):
+    os.makedirs(os.path.dirname(book_output), exist_ok=True)
+    start = time.perf_counter()
+    header, ranges = byte_ranges(input_file, chunk_bytes)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        jobs = [(input_file, s, e, header, tmpdir, n) for n, (s, e) in enumerate(ranges)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_books_worker, jobs))
+
+        # Global Author_id in serial first-seen order
+        authors = {}
+        remaps = []
+        for _, _, names, _ in results:
+            remap = [None]
+            for name in names:
+                if name not in authors:
+                    authors[name] = len(authors) + 1
+                remap.append(authors[name])
+            remaps.append(remap)
+
+        book_count = 0
+        relationship_count = 0
+        with open(book_output, 'w', newline='', encoding='utf-8') as bf, \
+             open(book_authors_output, 'w', newline='', encoding='utf-8') as rf:
+            csv.DictWriter(bf, fieldnames=['Isbn', 'Title']).writeheader()
+            rel_writer = csv.DictWriter(rf, fieldnames=['Author_id', 'Isbn'])
+            rel_writer.writeheader()
+            for (book_path, rel_path, _, count), remap in zip(results, remaps):
+                with open(book_path, 'r', newline='', encoding='utf-8') as part:
+                    shutil.copyfileobj(part, bf)
+                with open(rel_path, 'r', newline='', encoding='utf-8') as part:
+                    for local_id, isbn in csv.reader(part):
+                        rel_writer.writerow({'Author_id': remap[int(local_id)], 'Isbn': isbn})
+                        relationship_count += 1
+                book_count += count
+
+    with open(authors_output, 'w', newline='', encoding='utf-8') as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=['Author_id', 'Name'])
+        writer.writeheader()
+        writer.writerows({'Author_id': author_id, 'Name': name} for name, author_id in authors.items())
+
+    elapsed = time.perf_counter() - start
+    print(f"Created {book_output} with {book_count} books")
+    print(f"Created {authors_output} with {len(authors)} authors")
+    print(f"Created {book_authors_output} with {relationship_count} book-author relationships")
+    print(f"Normalized {book_count:,} books in {elapsed:.2f}s using {len(ranges)} chunks")
+    return {'books': book_count, 'authors': len(authors), 'book_authors': relationship_count}
+
+
+# ---------- borrowers ----------
+
+COLS = ["Card_id", "Ssn", "Bname", "Address", "Phone"]
+
+
+def _borrowers_worker(args):
+    path, start, end, header, tmpdir, n = args
+    out_path = os.path.join(tmpdir, f"borrowers.{n}")
+    with open(out_path, 'w', newline='', encoding='utf8') as f:
+        w = csv.writer(f)
+        for r in read_chunk(path, start, end, header, 'utf8', ','):
+            row = normalize_borrowers.normalize_row(r)
+            if row is not None:
+                w.writerow([row[c] for c in COLS])
+    return out_path
+
+
+def normalize_borrowers_parallel(inp_file, out_file, workers=None, chunk_bytes=CHUNK_BYTES):
+    os.makedirs(os.path.dirname(out_file), exist_ok=True)
+    header, ranges = byte_ranges(inp_file, chunk_bytes)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        jobs = [(inp_file, s, e, header, tmpdir, n) for n, (s, e) in enumerate(ranges)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_borrowers_worker, jobs))
+
+        # First-wins dedup, in file order, exactly like the serial loop
+        seen_card, seen_ssn = set(), set()
+        written = 0
+        with open(out_file, 'w', newline='', encoding='utf8') as f2:
+            w = csv.writer(f2)
+            w.writerow(COLS)
+            for part in parts:
+                with open(part, 'r', newline='', encoding='utf8') as f:
+                    for row in csv.reader(f):
+                        cid, ssn = row[0], row[1]
+                        if cid in seen_card:
+                            continue
+                        if ssn and ssn in seen_ssn:
+                            continue
+                        w.writerow(row)
+                        written += 1
+                        seen_card.add(cid)
+                        if ssn:
+                            seen_ssn.add(ssn)
+
+    print("wrote", written, "rows to", out_file)
+    return written
+
+
+if __name__ == "__main__":
+    normalize_books_parallel('../data/books.csv',
+                             '../normalized_data/normalized_book.csv',
+                             '../normalized_data/normalized_book_authors.csv',
+                             '../normalized_data/normalized_authors.csv')
@@ -0,0 +1,86 @@
+# Serialized API responses keyed on path + normalized query parameters,
+# stored under (change_log version, local bump() count) so any write retires
+# them. ETags are a hash of the body.
+
+import hashlib
+import os
+import threading
+
+import change_log
+from fine_cache import MISSING, LRUCache
+
+MAX_ENTRIES = int(os.environ.get("LIBRARY_RESPONSE_CACHE_SIZE", "5000"))
+TTL_SECONDS = float(os.environ.get("LIBRARY_RESPONSE_CACHE_TTL", "60"))
+
+_store = LRUCache(max_entries=MAX_ENTRIES, ttl=TTL_SECONDS)
+_version = 0
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "not_modified": 0, "bumps": 0}
+
+
+def _count(name):
+    with _lock:
+        _stats[name] += 1
+
+
+def version():
+    """Current cache version, or None when nothing may be cached."""
+    shared = change_log.version()
+    if shared is None:
+        return None
+    return (shared, _version)
+
+
+def bump():
+    """Something was written: no stored response may be served any more."""
+    global _version
+    with _lock:
+        _version += 1
+        _stats["bumps"] += 1
+
+
+def key(path, params):
+    """Same key for ?q=Harry&limit=12 and ?limit=12&q=harry%20 etc."""
+    items = []
+    for name in sorted(params):
+        for value in params.getlist(name) if hasattr(params, "getlist") else [params[name]]:
+            value = str(value).strip()
+            if value:
+                items.append((name, value.casefold() if name == "q" else value))
+    return (path, tuple(items))
+
+
+def etag(body):
+    return hashlib.sha1(body).hexdigest()[:20]
+
+
+def get(cache_key, current):
+    """(etag, body) stored under version current, or None."""
+    if current is None:
+        return None
+    entry = _store.get(cache_key, MISSING)
+    if entry is not MISSING and entry[0] == current:
+        _count("hits")
+        return entry[1], entry[2]
+    _count("misses")
+    return None
+
+
+def put(cache_key, stored_version, body):
+    """Store body as computed under stored_version; returns its etag."""
+    tag = etag(body)
+    if stored_version is not None and stored_version == version():
+        _store.set(cache_key, (stored_version, tag, body))
+    return tag
+
+
+def not_modified():
+    _count("not_modified")
+
+
+def stats():
+    with _lock:
+        out = dict(_stats)
+    out["version"] = version()
+    out["entries"] = len(_store)
+    return out
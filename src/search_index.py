@@ -0,0 +1,543 @@
+# In-memory n-gram index answering the book_search.py LIKE '%q%' search
+# without a MySQL round trip.
+
+import bisect
+import csv
+import heapq
+import itertools
+import re
+import threading
+import unicodedata
+
+GRAM = 3
+SORTED_POSTING = 1000   # postings at least this long are kept sorted for paging
+
+
+def fold(s):
+    """Lowercase and strip accents, like MySQL's default *_ai_ci collation."""
+    s = str(s or "")
+    if s.isascii():
+        return s.casefold()
+    s = unicodedata.normalize("NFKD", s)
+    return "".join(ch for ch in s if not unicodedata.combining(ch)).casefold()
+
+
+def grams(s):
+    """Every 1..GRAM character substring of s."""
+    out = set()
+    for n in range(1, GRAM + 1):
+        for i in range(len(s) - n + 1):
+            out.add(s[i:i + n])
+    return out
+
+
+class SearchIndex:
+    def __init__(self):
+        self.books = {}       # isbn -> {'isbn', 'title', 'authors', 'borrowed'}
+        self._fields = {}     # isbn -> folded searchable strings
+        self._postings = {}   # gram -> set of isbns
+        self._out = set()     # isbns currently borrowed
+        self._sorted = {}     # gram ('' for every book) -> sorted isbns, built on demand
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.books)
+
+    def add_book(self, isbn, title, authors, borrowed=False):
+        # Mirror the INNER JOIN on book_authors: no authors, not searchable.
+        if not authors:
+            return
+        with self._lock:
+            if isbn in self.books:
+                self.remove_book(isbn)
+            self.books[isbn] = {
+                "isbn": isbn,
+                "title": title,
+                "authors": ", ".join(authors),
+                "borrowed": bool(borrowed),
+            }
+            if borrowed:
+                self._out.add(isbn)
+            fields = [fold(isbn), fold(title)] + [fold(a) for a in authors]
+            self._fields[isbn] = fields
+            self._sorted.pop("", None)
+            for field in fields:
+                for g in grams(field):
+                    self._postings.setdefault(g, set()).add(isbn)
+                    self._sorted.pop(g, None)
+
+    def remove_book(self, isbn):
+        with self._lock:
+            if isbn not in self.books:
+                return
+            self._sorted.pop("", None)
+            for field in self._fields.pop(isbn):
+                for g in grams(field):
+                    self._sorted.pop(g, None)
+                    posting = self._postings.get(g)
+                    if posting is not None:
+                        posting.discard(isbn)
+                        if not posting:
+                            del self._postings[g]
+            del self.books[isbn]
+            self._out.discard(isbn)
+
+    def set_borrowed(self, isbn, borrowed):
+        """Keep availability in sync when a book is checked out or in."""
+        with self._lock:
+            book = self.books.get(isbn)
+            if book is not None:
+                book["borrowed"] = bool(borrowed)
+                if borrowed:
+                    self._out.add(isbn)
+                else:
+                    self._out.discard(isbn)
+
+    def match(self, query):
+        """Sorted isbns whose isbn, title or an author contains query."""
+        with self._lock:
+            return sorted(self._candidates(query))
+
+    def _candidates(self, query):
+        q = fold(query)
+        if not q:
+            return self.books.keys()
+        if len(q) <= GRAM:
+            return self._postings.get(q, set())
+
+        keys = {q[i:i + GRAM] for i in range(len(q) - GRAM + 1)}
+        postings = []
+        for k in keys:
+            posting = self._postings.get(k)
+            if not posting:
+                return set()
+            postings.append(posting)
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates &= posting
+            if not candidates:
+                return candidates
+        return {isbn for isbn in candidates
+                if any(q in field for field in self._fields[isbn])}
+
+    def page(self, query, status=None, limit=None, offset=0, after=None):
+        """(rows, total) for one page in isbn order; `after` is the previous page's last isbn."""
+        with self._lock:
+            chosen, total = self._select(query, status, limit, offset, after)
+            return [self.row(isbn) for isbn in chosen], total
+
+    def iter_page(self, query, status=None, limit=None, offset=0, after=None):
+        """Like page(), but yields rows one at a time from a snapshot of the matching isbns."""
+        with self._lock:
+            chosen, _ = self._select(query, status, limit, offset, after)
+        for isbn in chosen:
+            with self._lock:
+                row = self.row(isbn) if isbn in self.books else None
+            if row is not None:
+                yield row
+
+    def _select(self, query, status, limit, offset, after):
+        """(isbns on the page, total matches)."""
+        ids = self._candidates(query)
+        q = fold(query)
+        if len(q) <= GRAM and len(ids) >= SORTED_POSTING:
+            return self._select_sorted(q, ids, status, limit, offset, after)
+
+        if status == "IN":
+            ids = ids - self._out
+        elif status == "OUT":
+            ids = ids & self._out
+        total = len(ids)
+
+        if after is not None:
+            ids = [isbn for isbn in ids if isbn > after]
+        if limit is None:
+            return sorted(ids)[offset:], total
+        return heapq.nsmallest(offset + limit, ids)[offset:], total
+
+    def _select_sorted(self, q, ids, status, limit, offset, after):
+        # Broad one to three character queries: walk a cached sorted posting
+        # and stop at the end of the page instead of ordering every match
+        ordered = self._sorted.get(q)
+        if ordered is None:
+            ordered = self._sorted[q] = sorted(ids)
+        start = 0 if after is None else bisect.bisect_right(ordered, after)
+        stop = None if limit is None else offset + limit
+
+        if status is None:
+            return ordered[start + offset:None if stop is None else start + stop], len(ordered)
+        out = len(self._out & ids)
+        total = out if status == "OUT" else len(ordered) - out
+        wanted = status == "OUT"
+        chosen = []
+        for isbn in itertools.islice(ordered, start, None):
+            if (isbn in self._out) == wanted:
+                chosen.append(isbn)
+                if stop is not None and len(chosen) >= stop:
+                    break
+        return chosen[offset:], total
+
+    def search(self, query):
+        """Rows in the same shape as /api/search ('isbn', 'title', 'authors', 'availability')."""
+        with self._lock:
+            return [self.row(isbn) for isbn in self.match(query)]
+
+    def row(self, isbn):
+        book = self.books[isbn]
+        return {
+            "isbn": book["isbn"],
+            "title": book["title"],
+            "authors": book["authors"],
+            "availability": "OUT" if book["borrowed"] else "IN",
+        }
+
+
+def build_from_db(conn):
+    index = SearchIndex()
+    cursor = conn.cursor()
+    cursor.execute("SELECT books.isbn, books.title, books.borrowed, authors.name "
+                   "FROM books "
+                   "INNER JOIN book_authors ON books.isbn = book_authors.isbn "
+                   "INNER JOIN authors ON authors.author_id = book_authors.author_id "
+                   "ORDER BY books.isbn, authors.author_id")
+    _load_rows(index, cursor)
+    cursor.close()
+    return index
+
+
+def build_from_csv(books, authors, bookauthors):
+    names = {}
+    with open(authors, mode='r', newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            names[row['Author_id']] = row['Name']
+
+    by_isbn = {}
+    with open(bookauthors, mode='r', newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            by_isbn.setdefault(row['Isbn'], []).append(names[row['Author_id']])
+
+    index = SearchIndex()
+    with open(books, mode='r', newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            index.add_book(row['Isbn'], row['Title'], by_isbn.get(row['Isbn']), False)
+    return index
+
+
+def _load_rows(index, rows):
+    current, title, borrowed, authors = None, None, False, []
+    for (isbn, t, b, name) in rows:
+        if isbn != current:
+            if current is not None:
+                index.add_book(current, title, authors, borrowed)
+            current, title, borrowed, authors = isbn, t, b, []
+        authors.append(name)
+    if current is not None:
+        index.add_book(current, title, authors, borrowed)
+
+
+MAX_PAGE_SIZE = 500
+
+STATUS_FILTERS = {
+    'in': 'IN', 'available': 'IN',
+    'out': 'OUT', 'checked-out': 'OUT', 'checked_out': 'OUT',
+}
+
+
+def run_search(query, mode='index', status='', limit=None, offset=0, after=None):
+    """Body of an /api/search response, shared by the Flask and ASGI apps."""
+    status = STATUS_FILTERS.get((status or '').strip().lower())
+    offset = max(offset or 0, 0)
+    if limit is not None:
+        limit = max(0, min(limit, MAX_PAGE_SIZE))
+
+    ranked = mode == 'fulltext'
+    if mode in ('sql', 'fulltext'):
+        from db_pool import db as connect
+        db = connect()
+        try:
+            sql, params = _statement(query, ranked)
+            total = _count(db, sql, params, BORROWED[status])
+            books = list(_iter_page(db, sql, params, _page(status, limit, offset, after, ranked)))
+        finally:
+            db.close()
+    else:
+        books, total = get_index().page(query, status=status, limit=limit, offset=offset, after=after)
+
+    return {
+        'books': books,
+        'total': total,
+        'limit': limit,
+        'offset': offset,
+        'next_after': books[-1]['isbn'] if books and not ranked else None,
+    }
+
+
+def stream_search(query, mode='index', status='', limit=None, offset=0, after=None):
+    """run_search's rows as a generator; sql and fulltext rows come straight off the cursor."""
+    status = STATUS_FILTERS.get((status or '').strip().lower())
+    offset = max(offset or 0, 0)
+    if limit is not None:
+        limit = max(0, min(limit, MAX_PAGE_SIZE))
+
+    if mode not in ('sql', 'fulltext'):
+        yield from get_index().iter_page(query, status=status, limit=limit, offset=offset, after=after)
+        return
+
+    ranked = mode == 'fulltext'
+    from db_pool import db as connect
+    db = connect()
+    finished = False
+    try:
+        sql, params = _statement(query, ranked)
+        yield from _iter_page(db, sql, params, _page(status, limit, offset, after, ranked))
+        finished = True
+    finally:
+        if finished:
+            db.close()
+        else:
+            db.discard()
+
+
+STREAM_BATCH = 500
+
+
+def _fetch_batches(cursor):
+    while True:
+        rows = cursor.fetchmany(STREAM_BATCH)
+        if not rows:
+            return
+        yield from rows
+
+
+# Bound-parameter book_search.py queries, prepared once per pooled connection
+SEARCH_SQL = (
+    "SELECT books.isbn, books.title, GROUP_CONCAT(authors.name SEPARATOR ', '), books.borrowed "
+    "FROM books "
+    "INNER JOIN book_authors ON books.isbn = book_authors.isbn "
+    "INNER JOIN authors ON authors.author_id = book_authors.author_id "
+    "WHERE books.isbn LIKE %s OR books.title LIKE %s OR authors.name LIKE %s "
+    "GROUP BY books.isbn ORDER BY books.isbn")
+
+# A hyphenated ISBN ("0-439-13959-7") is also matched against the stored
+# digits, on top of the plain substring match.
+SEARCH_ISBN_SQL = SEARCH_SQL.replace(
+    "OR authors.name LIKE %s ", "OR authors.name LIKE %s OR books.isbn LIKE %s ")
+
+# Word search against the FULLTEXT indexes from migrations.py, best match
+# first: a book scores its title relevance plus its best author's.
+FULLTEXT_SQL = (
+    "SELECT books.isbn, books.title, GROUP_CONCAT(authors.name SEPARATOR ', '), books.borrowed, "
+    "       MAX(MATCH(books.title) AGAINST (%s)) + MAX(MATCH(authors.name) AGAINST (%s)) AS score "
+    "FROM books "
+    "INNER JOIN book_authors ON books.isbn = book_authors.isbn "
+    "INNER JOIN authors ON authors.author_id = book_authors.author_id "
+    "WHERE books.isbn IN ("
+    "    SELECT isbn FROM books WHERE MATCH(title) AGAINST (%s) "
+    "    UNION "
+    "    SELECT book_authors.isbn FROM book_authors "
+    "    INNER JOIN authors ON authors.author_id = book_authors.author_id "
+    "    WHERE MATCH(authors.name) AGAINST (%s)) "
+    "GROUP BY books.isbn ORDER BY score DESC, books.isbn")
+
+def _paged(sql, after=True):
+    """sql limited to one availability (and isbns after a cursor) and a LIMIT window."""
+    head, tail = sql.split(" GROUP BY ")
+    head = head.replace("WHERE ", "WHERE (", 1).rstrip() + ") AND books.borrowed IN (%s, %s)"
+    if after:
+        head += " AND books.isbn > %s"
+    return head + " GROUP BY " + tail + " LIMIT %s OFFSET %s"
+
+
+def _counted(sql):
+    """COUNT of the books sql matches in one availability; drops the select list's placeholders."""
+    select, rest = _paged(sql, after=False).split(" GROUP BY ")[0].split(" FROM books ", 1)
+    return "SELECT COUNT(DISTINCT books.isbn) FROM books " + rest, select.count("%s")
+
+
+# One page: borrowed in (a, b), [isbn > after,] limit, offset
+PAGED_SQL = {
+    SEARCH_SQL: _paged(SEARCH_SQL),
+    SEARCH_ISBN_SQL: _paged(SEARCH_ISBN_SQL),
+    FULLTEXT_SQL: _paged(FULLTEXT_SQL, after=False),
+}
+COUNT_SQL = {sql: _counted(sql) for sql in PAGED_SQL}
+NO_LIMIT = 2 ** 62   # MySQL has no LIMIT ALL
+BORROWED = {None: (0, 1), 'IN': (0, 0), 'OUT': (1, 1)}
+
+
+def _page(status, limit, offset, after, ranked):
+    # Keyset paging follows isbn order, which relevance order does not
+    keyset = () if ranked else (after or '',)
+    return BORROWED[status] + keyset + (NO_LIMIT if limit is None else limit, offset)
+
+# Six or more ISBN characters once the hyphens are taken out
+ISBN_PREFIX = re.compile(r"[0-9]{5,12}[0-9Xx]")
+
+
+def like_escape(text):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _statement(query, ranked=False):
+    """(sql, params) of the unpaged search for query."""
+    if ranked:
+        return FULLTEXT_SQL, (query,) * 4
+    pattern = "%" + like_escape(query) + "%"
+    isbn = query.replace("-", "").strip()
+    if isbn != query.strip() and ISBN_PREFIX.fullmatch(isbn):
+        return SEARCH_ISBN_SQL, (pattern, pattern, pattern, like_escape(isbn.upper()) + "%")
+    return SEARCH_SQL, (pattern, pattern, pattern)
+
+
+def _execute_sql(conn, query):
+    sql, params = _statement(query)
+    cursor = conn.prepared(sql)
+    cursor.execute(sql, params)
+    return cursor
+
+
+def _count(conn, sql, params, borrowed):
+    count_sql, skip = COUNT_SQL[sql]
+    cursor = conn.prepared(count_sql)
+    cursor.execute(count_sql, params[skip:] + borrowed)
+    return cursor.fetchall()[0][0]
+
+
+def _iter_page(conn, sql, params, page):
+    cursor = conn.prepared(PAGED_SQL[sql])
+    cursor.execute(PAGED_SQL[sql], params + page)
+    for row in _fetch_batches(cursor):
+        yield _book(*row)
+
+
+def _book(isbn, title, name, borrowed, score=None):
+    book = {
+        'isbn': isbn,
+        'title': title,
+        'authors': name,
+        'availability': 'IN' if not borrowed else 'OUT'
+    }
+    if score is not None:
+        book['score'] = round(float(score), 4)
+    return book
+
+
+def query_sql(conn, query):
+    """(isbn, title, authors, borrowed) rows for query using prepared statements."""
+    return _execute_sql(conn, query).fetchall()
+
+
+def search_sql(query):
+    """book_search.py's LIKE search, served by MySQL (mode=sql)."""
+    from db_pool import db as connect
+
+    db = connect()
+    try:
+        rows = query_sql(db, query)
+    finally:
+        db.close()
+
+    return [{
+        'isbn': isbn,
+        'title': title,
+        'authors': name,
+        'availability': 'IN' if not borrowed else 'OUT'
+    } for (isbn, title, name, borrowed) in rows]
+
+
+def search_fulltext(query):
+    """Relevance-ranked MATCH ... AGAINST search (mode=fulltext)."""
+    from db_pool import db as connect
+
+    db = connect()
+    try:
+        return list(_iter_fulltext(db, query))
+    finally:
+        db.close()
+
+
+def _iter_fulltext(conn, query):
+    sql, params = _statement(query, ranked=True)
+    cursor = conn.prepared(sql)
+    cursor.execute(sql, params)
+    for row in _fetch_batches(cursor):
+        yield _book(*row)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Process-wide index, built from the Library database on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                import change_log
+                from db_pool import db as connect
+
+                change_log.start()
+                conn = connect()
+                try:
+                    _index = build_from_db(conn)
+                finally:
+                    conn.close()
+    return _index
+
+
+def is_built():
+    """True once get_index() can answer without touching the database."""
+    return _index is not None
+
+
+def set_borrowed(isbn, borrowed):
+    if _index is not None:
+        _index.set_borrowed(isbn, borrowed)
+
+
+def refresh_borrowed(isbns):
+    """Re-read availability for books another process checked out or in."""
+    isbns = list(isbns)
+    if _index is None or not isbns:
+        return
+    from db_pool import db as connect
+
+    conn = connect()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT isbn, borrowed FROM books WHERE isbn IN ({})".format(
+            ", ".join(["%s"] * len(isbns))), isbns)
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+    for isbn, borrowed in rows:
+        _index.set_borrowed(isbn, borrowed)
+
+
+def discard():
+    """Drop the index; the next get_index() builds it again from the database."""
+    global _index
+    _index = None
+
+
+if __name__ == "__main__":
+    import time
+
+    start = time.perf_counter()
+    index = build_from_csv('../normalized_data/normalized_book.csv',
+                           '../normalized_data/normalized_authors.csv',
+                           '../normalized_data/normalized_book_authors.csv')
+    print(f"Indexed {len(index)} books in {time.perf_counter() - start:.2f}s")
+
+    while True:
+        q = input("Search: ")
+        start = time.perf_counter()
+        rows = index.search(q)
+        elapsed = (time.perf_counter() - start) * 1000
+        for row in rows[:20]:
+            print("{: <10} {: <60} {: <40} {}".format(
+                row['isbn'], row['title'][:60], row['authors'][:40], row['availability']))
+        print(f"{len(rows)} results in {elapsed:.3f} ms")
@@ -0,0 +1,117 @@
+# Incremental JSON output for large result sets: rows are serialized as they
+# arrive and sent in compressed chunks of about CHUNK_BYTES.
+# brotli is optional; without it only gzip and identity are offered.
+
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+
+from werkzeug.http import http_date
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CHUNK_BYTES = 16 * 1024
+
+NDJSON = "application/x-ndjson"
+
+
+def default(value):
+    """Decimal and date values the way Flask's jsonify writes them."""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (date, datetime)):
+        return http_date(value)
+    raise TypeError(repr(value))
+
+
+def dumps(value):
+    """Compact JSON with sorted keys, byte for byte what jsonify sends."""
+    return json.dumps(value, default=default, separators=(",", ":"), sort_keys=True)
+
+
+def negotiate(accept_encoding):
+    """Best of br / gzip the client accepts, or None for identity."""
+    offered = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            offered[name.strip().lower()] = q
+    for name in (("br", "gzip") if brotli is not None else ("gzip",)):
+        if offered.get(name, offered.get("*", 0)) > 0:
+            return name
+    return None
+
+
+def ndjson(rows):
+    """One JSON object per line."""
+    for row in rows:
+        yield dumps(row) + "\n"
+
+
+def json_document(key, rows, **fields):
+    """{"success": true, ...fields, key: [rows...], "count": n} written as it goes."""
+    head = dict(success=True, **fields)
+    yield dumps(head)[:-1] + ',"{}":['.format(key)
+    count = 0
+    for row in rows:
+        yield ("," if count else "") + dumps(row)
+        count += 1
+    yield '],"count":{}}}'.format(count)
+
+
+def chunked(pieces, size=CHUNK_BYTES):
+    """Join small string pieces into ~size byte chunks."""
+    buf, length = [], 0
+    for piece in pieces:
+        data = piece.encode("utf-8")
+        buf.append(data)
+        length += len(data)
+        if length >= size:
+            yield b"".join(buf)
+            buf, length = [], 0
+    if buf:
+        yield b"".join(buf)
+
+
+def primed(chunks):
+    """chunks with the first one produced now, so query errors raise before the headers go out."""
+    chunks = iter(chunks)
+    first = next(chunks, None)
+
+    def rest():
+        try:
+            if first is not None:
+                yield first
+            yield from chunks
+        finally:
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+    return rest()
+
+
+def encode(pieces, encoding=None, size=CHUNK_BYTES):
+    """Byte chunks for the response body, compressed and flushed one by one with `encoding`."""
+    chunks = chunked(pieces, size)
+    if encoding == "gzip":
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+    elif encoding == "br":
+        compressor = brotli.Compressor(quality=4)
+        for chunk in chunks:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+    else:
+        yield from chunks
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# Search-box typeahead: title and author completions for a prefix, ranked
+# by how often the books have been borrowed.
+
+import bisect
+import csv
+import heapq
+import os
+import threading
+import time
+
+from search_index import fold
+
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+TOP_PREFIX = 3        # prefixes up to this long are answered from a table
+REFRESH_SECONDS = float(os.environ.get("LIBRARY_SUGGEST_REFRESH", "900"))
+RETRY_SECONDS = 60    # after a failed background refresh
+
+
+def _key(text):
+    return " ".join(fold(text).split())
+
+
+class SuggestIndex:
+    def __init__(self, books, loans=None):
+        """books: iterable of (isbn, title, [author names]); loans: isbn -> times borrowed."""
+        loans = loans or {}
+        weights = {}   # (type, key) -> [text, weight]
+        for isbn, title, authors in books:
+            n = loans.get(isbn, 0)
+            for kind, text in [("title", title)] + [("author", a) for a in authors]:
+                entry = weights.setdefault((kind, _key(text)), [text, 0])
+                entry[1] += n
+
+        # Most borrowed first, then shorter, then alphabetical
+        ranked = sorted(weights.items(), key=lambda item: (-item[1][1], len(item[0][1]), item[0][1]))
+        self.suggestions = [(text, kind, weight) for (kind, _), (text, weight) in ranked]
+
+        keys = []
+        for sid, ((kind, key), _) in enumerate(ranked):
+            start = 0
+            for word in key.split(" "):
+                keys.append((key[start:], sid))
+                start += len(word) + 1
+        keys.sort()
+        self._keys = [k for k, _ in keys]
+        self._ids = [sid for _, sid in keys]
+
+        # sids are in rank order, so the first MAX_LIMIT seen per prefix are its best
+        self._top = {}
+        for key, sid in sorted(keys, key=lambda item: item[1]):
+            for n in range(1, min(TOP_PREFIX, len(key)) + 1):
+                bucket = self._top.setdefault(key[:n], [])
+                if len(bucket) < MAX_LIMIT and (not bucket or bucket[-1] != sid):
+                    bucket.append(sid)
+
+    def __len__(self):
+        return len(self.suggestions)
+
+    def complete(self, prefix, limit=DEFAULT_LIMIT):
+        p = _key(prefix)
+        if not p:
+            return []
+        if len(p) <= TOP_PREFIX:
+            sids = self._top.get(p, [])[:limit]
+        else:
+            lo = bisect.bisect_left(self._keys, p)
+            hi = bisect.bisect_left(self._keys, p + "\uffff", lo)
+            sids = heapq.nsmallest(limit, set(self._ids[lo:hi]))
+        return [{"text": self.suggestions[sid][0], "type": self.suggestions[sid][1]} for sid in sids]
+
+
+def load_from_db(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT books.isbn, books.title, authors.name "
+                   "FROM books "
+                   "INNER JOIN book_authors ON books.isbn = book_authors.isbn "
+                   "INNER JOIN authors ON authors.author_id = book_authors.author_id "
+                   "ORDER BY books.isbn")
+    books = {}
+    for isbn, title, name in cursor:
+        books.setdefault(isbn, (isbn, title, []))[2].append(name)
+    cursor.execute("SELECT isbn, COUNT(*) FROM book_loans GROUP BY isbn")
+    loans = dict(cursor.fetchall())
+    cursor.close()
+    return SuggestIndex(books.values(), loans)
+
+
+def load_from_csv(books, authors, bookauthors):
+    with open(authors, mode='r', newline='', encoding='utf-8') as f:
+        names = {row['Author_id']: row['Name'] for row in csv.DictReader(f)}
+    by_isbn = {}
+    with open(bookauthors, mode='r', newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            by_isbn.setdefault(row['Isbn'], []).append(names[row['Author_id']])
+    with open(books, mode='r', newline='', encoding='utf-8') as f:
+        rows = [(row['Isbn'], row['Title'], by_isbn[row['Isbn']])
+                for row in csv.DictReader(f) if row['Isbn'] in by_isbn]
+    return SuggestIndex(rows)
+
+
+_index = None
+_built_at = 0.0
+_index_lock = threading.Lock()
+
+
+def _rebuild():
+    global _index, _built_at
+    from db_pool import db as connect
+    conn = connect()
+    try:
+        _index = load_from_db(conn)
+        _built_at = time.monotonic()
+    finally:
+        conn.close()
+
+
+def _refresh():
+    global _built_at
+    try:
+        _rebuild()
+    except Exception as e:
+        # Keep the old index and try again in RETRY_SECONDS, not on every request
+        print("suggest: refresh failed:", e)
+        _built_at = time.monotonic() - REFRESH_SECONDS + min(RETRY_SECONDS, REFRESH_SECONDS)
+    finally:
+        _index_lock.release()
+
+
+def get_index():
+    """Process-wide index; rebuilt in the background once REFRESH_SECONDS old."""
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _rebuild()
+    elif time.monotonic() - _built_at > REFRESH_SECONDS and _index_lock.acquire(blocking=False):
+        # Popularity drifts slowly; keep answering from the old index meanwhile
+        threading.Thread(target=_refresh, daemon=True).start()
+    return _index
+
+
+def is_built():
+    """True once get_index() can answer without touching the database."""
+    return _index is not None
+
+
+def suggest(prefix, limit=DEFAULT_LIMIT):
+    limit = max(1, min(limit or DEFAULT_LIMIT, MAX_LIMIT))
+    return get_index().complete(prefix, limit)
+
+
+if __name__ == "__main__":
+    index = load_from_csv('../normalized_data/normalized_book.csv',
+                          '../normalized_data/normalized_authors.csv',
+                          '../normalized_data/normalized_book_authors.csv')
+    print(f"{len(index)} titles and authors")
+    while True:
+        q = input("Prefix (blank to quit): ")
+        if not q.strip():
+            break
+        start = time.perf_counter()
+        rows = index.complete(q)
+        elapsed = (time.perf_counter() - start) * 1000
+        for r in rows:
+            print(f"  [{r['type']}] {r['text']}")
+        print(f"{len(rows)} suggestion(s) in {elapsed:.3f} ms")
@@ -0,0 +1,23 @@
+import pytest
+
+import book_loans
+
+
+@pytest.fixture
+def no_database(monkeypatch):
+    def fail():
+        raise AssertionError("the database should not be touched")
+    monkeypatch.setattr(book_loans, "ensure_schema", fail)
+    monkeypatch.setattr(book_loans, "connect", fail)
+
+
+@pytest.mark.parametrize("isbns", ["0195153445", {"isbn": "0195153445"}, 195153445])
+def test_checkout_many_rejects_non_list(no_database, isbns):
+    with pytest.raises(ValueError, match="list"):
+        book_loans.checkout_many(1, isbns)
+
+
+@pytest.mark.parametrize("isbns", ["0195153445", {"isbn": "0195153445"}, 195153445])
+def test_checkin_many_rejects_non_list(no_database, isbns):
+    with pytest.raises(ValueError, match="list"):
+        book_loans.checkin_many(isbns)
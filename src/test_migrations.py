@@ -0,0 +1,125 @@
+import os
+
+import pytest
+
+mysql = pytest.importorskip("mysql.connector")
+
+import db_pool
+import migrations
+
+TEST_DB = os.environ.get("LIBRARY_TEST_DB_NAME", "library_migration_test")
+
+# The tables as the original create_tables.py made them, with key checks off
+BASELINE = [
+    "CREATE TABLE `books` ("
+    "  `isbn` varchar(10) NOT NULL,"
+    "  `title` varchar(200) NOT NULL,"
+    "  `borrowed` boolean NOT NULL,"
+    "  PRIMARY KEY (`isbn`)"
+    ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4",
+
+    "CREATE TABLE `authors` ("
+    "  `name` varchar(100) NOT NULL,"
+    "  `author_id` int(10) NOT NULL,"
+    "  PRIMARY KEY (`author_id`)"
+    ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4",
+
+    "CREATE TABLE `book_authors` ("
+    "  `isbn` varchar(10) NOT NULL,"
+    "  `author_id` int(10) NOT NULL,"
+    "  FOREIGN KEY (`isbn`) "
+    "       REFERENCES `books` (`isbn`) ON DELETE CASCADE,"
+    "  FOREIGN KEY (`author_id`) "
+    "       REFERENCES `authors` (`author_id`)"
+    ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4",
+
+    "CREATE TABLE `borrowers` ("
+    "  `ssn` int(9) NOT NULL,"
+    "  `name` varchar(20) NOT NULL,"
+    "  `card_id` int(10) NOT NULL,"
+    "  `address` varchar(100) NOT NULL,"
+    "  `phone` varchar(10),"
+    "  PRIMARY KEY (`card_id`),"
+    "UNIQUE KEY `ssn` (`ssn`)"
+    ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4",
+
+    "CREATE TABLE `book_loans` ("
+    "  `loan_id` int(10) NOT NULL,"
+    "  `isbn` varchar(10) NOT NULL,"
+    "  `card_id` int(10) NOT NULL,"
+    "  `date_out` date NOT NULL,"
+    "  `due_date` date NOT NULL,"
+    "  `date_in` date NOT NULL,"
+    "  `loan_count` enum('1', '2', '3') NOT NULL,"
+    "  PRIMARY KEY (loan_id),"
+    "  UNIQUE KEY `loans_per_borrower` (`loan_count`, `card_id`),"
+    "  FOREIGN KEY (`card_id`) "
+    "       REFERENCES `borrower` (`card_id`)"
+    ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4",
+
+    "CREATE TABLE `fines` ("
+    "  `loan_id` int(10) NOT NULL,"
+    "  `fine_amt` decimal(4,2) NOT NULL,"
+    "  `paid` boolean NOT NULL,"
+    "  PRIMARY KEY (`loan_id`),"
+    "  FOREIGN KEY (`loan_id`) "
+    "       REFERENCES `book_loans` (`loan_id`)"
+    ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4",
+]
+
+
+@pytest.fixture
+def baseline_db():
+    config = dict(db_pool.DB_CONFIG)
+    del config["database"]
+    try:
+        conn = mysql.connect(**config)
+    except mysql.Error as e:
+        pytest.skip("MySQL not available: {}".format(e))
+
+    cursor = conn.cursor()
+    cursor.execute("DROP DATABASE IF EXISTS {}".format(TEST_DB))
+    cursor.execute("CREATE DATABASE {} DEFAULT CHARACTER SET 'utf8'".format(TEST_DB))
+    cursor.execute("USE {}".format(TEST_DB))
+    cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+    for table in BASELINE:
+        cursor.execute(table)
+    cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+    cursor.execute("INSERT INTO books VALUES ('0195153448', 'Classical Mythology', FALSE)")
+    cursor.execute("INSERT INTO borrowers VALUES (850382035, 'Mark Morgan', 1, "
+                   "'5677 Coolidge Street, Richardson, TX', '4695550100')")
+    conn.commit()
+    cursor.close()
+    try:
+        yield conn
+    finally:
+        cursor = conn.cursor()
+        cursor.execute("DROP DATABASE IF EXISTS {}".format(TEST_DB))
+        cursor.close()
+        conn.close()
+
+
+def test_migrate_baseline_schema(baseline_db):
+    # Every migration applies cleanly to the original tables, and once
+    # applied the next run has nothing left to do
+    names = [name for _, name, _ in migrations.MIGRATIONS]
+    assert migrations.migrate(baseline_db) == names
+    assert migrations.migrate(baseline_db) == []
+
+    cursor = baseline_db.cursor()
+    assert migrations._foreign_keys(cursor, "book_loans", "card_id")[0][1] == "borrowers"
+    assert migrations._foreign_keys(cursor, "fines", "loan_id")[0][1] == "book_loans"
+
+    # What book_loans.checkout and checkin write now passes the key checks
+    cursor.execute("INSERT INTO book_loans (isbn, card_id, date_out, due_date, date_in, loan_count) "
+                   "VALUES ('0195153448', 1, '2026-01-01', '2026-01-15', NULL, '1')")
+    loan_id = cursor.lastrowid
+    cursor.execute("UPDATE book_loans SET date_in = '2026-01-20', loan_count = NULL "
+                   "WHERE loan_id = %s", (loan_id,))
+    cursor.execute("INSERT INTO fines (loan_id, fine_amt, paid) VALUES (%s, 1.25, 0)", (loan_id,))
+    baseline_db.commit()
+    cursor.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
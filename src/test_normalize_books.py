@@ -1,59 +1,55 @@
-import csv, os
+import validate_normalized
 
-def test_normalize_books(books, authors, bookauthors):
+BOOKS = "Isbn,Title\n0195153445,Classical Mythology\n0002005018,Clara Callan\n"
+AUTHORS = "Author_id,Name\n1,Mark P. O. Morford\n2,Richard Bruce Wright\n"
+BOOK_AUTHORS = "Author_id,Isbn\n1,0195153445\n2,0002005018\n"
 
-    existingIsbns = []
-    existingAuthorIDs = []
 
-    with open(books, mode='r', newline='', encoding='utf-8') as f:
+def validate(tmp_path, books=BOOKS, authors=AUTHORS, bookauthors=BOOK_AUTHORS):
+    paths = []
+    for name, text in (("book", books), ("authors", authors), ("book_authors", bookauthors)):
+        path = tmp_path / f"normalized_{name}.csv"
+        path.write_text(text, encoding="utf-8")
+        paths.append(str(path))
+    return validate_normalized.validate_catalog(*paths)
 
-        reader = csv.DictReader(f)
-        curRow = 1
 
-        for row in reader:
-            isbn = row['Isbn']
-            if len(isbn) > 10:
-                print(f"Row {curRow} in books has an invalid ISBN length!")
+def problems(report):
+    return {(e['file'], e['row'], e['code'], e['value']) for e in report.errors}
 
-            existingIsbns.append(isbn)
-            curRow += 1
 
-    with open(authors, mode='r', newline='', encoding='utf-8') as f:
+def test_clean_catalog(tmp_path):
+    report = validate(tmp_path)
+    assert report.ok
+    assert report.rows == {'books': 2, 'authors': 2, 'book_authors': 2}
 
-        reader = csv.DictReader(f)
-        curRow = 1
 
-        for row in reader:
-            a_id = row['Author_id']
-            if int(a_id) != curRow:
-                print(f"Row {curRow} in authors has an invalid Author ID!")
+def test_duplicate_book_author(tmp_path):
+    # "Pat Hutchins,Pat Hutchins" in books.csv gives the same pair twice;
+    # this is what the duplicate_pk rows in normalized_book_authors.csv are
+    report = validate(tmp_path, bookauthors=BOOK_AUTHORS + "1,0195153445\n")
+    assert problems(report) == {('book_authors', 3, 'duplicate_pk', '1,0195153445')}
 
-            existingAuthorIDs.append(a_id)
-            curRow += 1
 
-    with open(bookauthors, mode='r', newline='', encoding='utf-8') as f:
+def test_orphan_foreign_keys(tmp_path):
+    report = validate(tmp_path, bookauthors=BOOK_AUTHORS + "3,0195153445\n1,0439136350\n")
+    assert problems(report) == {
+        ('book_authors', 3, 'unknown_author', '3'),
+        ('book_authors', 4, 'unknown_isbn', '0439136350'),
+    }
 
-        reader = csv.DictReader(f)
-        curRow = 1
 
-        for row in reader:
-            a_id = row['Author_id']
-            isbn = row['Isbn']
+def test_bad_isbn(tmp_path):
+    report = validate(tmp_path, books=BOOKS + "978019515344,Too Long\n019515344Y,Bad Check Digit\n")
+    assert problems(report) == {
+        ('books', 3, 'isbn_format', '978019515344'),
+        ('books', 4, 'isbn_format', '019515344Y'),
+    }
 
-            if a_id not in existingAuthorIDs:
-                print(f"Row {curRow} in book_authors has an unknown author id!")
-
-            if isbn not in existingIsbns:
-                print(f"Row {curRow} in book_authors has an unknown ISBN value!")
-
-            curRow += 1
 
 if __name__ == "__main__":
-    # Define file paths
-    books = '../normalized_data/normalized_book.csv'
-    authors = '../normalized_data/normalized_authors.csv'
-    book_authors = '../normalized_data/normalized_book_authors.csv'
-
-    # Test data
-    test_normalize_books(books, authors, book_authors)
-    print("All files validated")
\ No newline at end of file
+    report = validate_normalized.validate_catalog('../normalized_data/normalized_book.csv',
+                                                  '../normalized_data/normalized_authors.csv',
+                                                  '../normalized_data/normalized_book_authors.csv')
+    report.print()
+    print("All files validated" if report.ok else "Validation found problems")
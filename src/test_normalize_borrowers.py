@@ -1,37 +1,46 @@
-import csv
-import os
-
-def test_normalize_borrowers(borrowers):
-  existingSSns = []
-  existingPhoneNum = []
-  existingEmailAddr = []
-
-  with open(borrowers, mode='r', newline='', encoding='utf-8') as f:
-
-    reader = csv.DictReader(f)
-    curRow = 1
-
-    for row in reader:
-      ssn = row['ssn']
-      phoneNum = row['phone']
-      emailAddr = row['email']
-       if len(isbn) > 11:
-         print(f"Row {curRow} in borrowers has an invalid SSN length!")
-       if len(phoneNum) > 15:
-         print(f"Row {curRow} in borrowers has an invalid phone number length!")
-       if '@' not in emailAddr:
-         print(f"Row {curRow} in borrowers has an invalid email address format!")
-         
-       existingSSns.append(ssn)
-       existingPhoneNum.append(phoneNum)
-       existingEmailAddr.append(emailAddr)
-       curRow += 1
-
-   if __name__ == "__main__":
-    # Define file paths
-    borrowers = '../data/borrowers.csv'
-
-
-    # Normalize the books data
-    test_normalize_borrowers(borrowers)
-    print("All files validated")
+import validate_normalized
+
+NORMALIZED = ("Card_id,Ssn,Bname,Address,Phone\n"
+              "000001,850473740,Mark Morgan,\"5677 Coolidge Street, Plano, TX\",4699041438\n"
+              "000002,256954382,Eric Warren,\"9062 Schurz Drive, Dallas, TX\",2147018127\n")
+RAW = ("ID0000id,ssn,first_name,last_name,email,address,city,state,phone\n"
+       "ID000001,850-47-3740,Mark,Morgan,mmorgan0@g.co,5677 Coolidge Street,Plano,TX,(469) 904-1438\n")
+
+
+def validate(tmp_path, text):
+  path = tmp_path / "borrowers.csv"
+  path.write_text(text, encoding="utf-8")
+  report = validate_normalized.ValidationReport()
+  validate_normalized.validate_borrowers(str(path), report)
+  return report
+
+
+def problems(report):
+  return {(e['row'], e['code']) for e in report.errors}
+
+
+def test_clean_borrowers(tmp_path):
+  assert validate(tmp_path, NORMALIZED).ok
+  assert validate(tmp_path, RAW).ok
+
+
+def test_duplicate_card_id_and_ssn(tmp_path):
+  report = validate(tmp_path, NORMALIZED + "000002,850473740,Ann Lee,\"1 Main St, Dallas, TX\",2145550100\n")
+  assert problems(report) == {(3, 'duplicate_pk'), (3, 'duplicate_ssn')}
+
+
+def test_bad_formats(tmp_path):
+  report = validate(tmp_path, RAW + "ID000002,256-95-438,Eric,Warren,ewarren1,9062 Schurz Drive,Dallas,TX,(214) 701-812\n")
+  assert problems(report) == {(2, 'ssn_format'), (2, 'phone_format'), (2, 'email_format')}
+
+
+def test_unknown_header(tmp_path):
+  report = validate(tmp_path, "id,name\n1,Mark Morgan\n")
+  assert problems(report) == {(0, 'missing_column')}
+
+
+if __name__ == "__main__":
+  report = validate_normalized.ValidationReport()
+  validate_normalized.validate_borrowers('../data/borrowers.csv', report)
+  report.print()
+  print("All files validated" if report.ok else "Validation found problems")
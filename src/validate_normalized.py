@@ -0,0 +1,166 @@
+# Validation for the normalized csv files (and raw borrowers.csv); problems
+# are collected in a ValidationReport.
+
+import csv
+import re
+from collections import Counter
+
+ISBN10 = re.compile(r"^\d{9}[\dXx]$")
+SSN = re.compile(r"^\d{9}$")
+PHONE = re.compile(r"^\d{10}$")
+
+
+class ValidationReport:
+    def __init__(self, max_errors=1000):
+        self.max_errors = max_errors
+        self.errors = []
+        self.counts = Counter()
+        self.rows = Counter()
+
+    def add(self, file, row, code, message, value=None):
+        self.counts[(file, code)] += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({
+                'file': file,
+                'row': row,
+                'code': code,
+                'message': message,
+                'value': value,
+            })
+
+    @property
+    def ok(self):
+        return not self.counts
+
+    def summary(self):
+        lines = []
+        for file, n in self.rows.items():
+            problems = sum(c for (f, _), c in self.counts.items() if f == file)
+            lines.append(f"{file}: {n} rows, {problems} problems")
+            for (f, code), c in sorted(self.counts.items()):
+                if f == file:
+                    lines.append(f"  {code}: {c}")
+        return "\n".join(lines)
+
+    def print(self, limit=20):
+        for e in self.errors[:limit]:
+            print(f"Row {e['row']} in {e['file']}: {e['message']} ({e['value']!r})")
+        if sum(self.counts.values()) > limit:
+            print(f"... {sum(self.counts.values()) - limit} more")
+        print(self.summary())
+
+
+def rows(path):
+    """(row number, dict) pairs, row 1 being the first line after the header."""
+    with open(path, mode='r', newline='', encoding='utf-8') as f:
+        yield from enumerate(csv.DictReader(f), start=1)
+
+
+def validate_books(path, report, isbns):
+    for n, row in rows(path):
+        report.rows['books'] += 1
+        isbn = row['Isbn']
+        if not ISBN10.match(isbn):
+            report.add('books', n, 'isbn_format', "invalid ISBN-10", isbn)
+        if isbn in isbns:
+            report.add('books', n, 'duplicate_pk', "duplicate Isbn", isbn)
+        if not row['Title'].strip():
+            report.add('books', n, 'empty_title', "empty title", isbn)
+        isbns.add(isbn)
+
+
+def validate_authors(path, report, author_ids):
+    names = set()
+    for n, row in rows(path):
+        report.rows['authors'] += 1
+        a_id = row['Author_id']
+        if not a_id.isdigit() or int(a_id) != n:
+            report.add('authors', n, 'author_id_gap', "Author_id is not contiguous", a_id)
+        if a_id in author_ids:
+            report.add('authors', n, 'duplicate_pk', "duplicate Author_id", a_id)
+        if row['Name'] in names:
+            report.add('authors', n, 'duplicate_name', "author name listed twice", row['Name'])
+        author_ids.add(a_id)
+        names.add(row['Name'])
+
+
+def validate_book_authors(path, report, isbns, author_ids):
+    pairs = set()
+    for n, row in rows(path):
+        report.rows['book_authors'] += 1
+        a_id, isbn = row['Author_id'], row['Isbn']
+        if a_id not in author_ids:
+            report.add('book_authors', n, 'unknown_author', "unknown author id", a_id)
+        if isbn not in isbns:
+            report.add('book_authors', n, 'unknown_isbn', "unknown ISBN value", isbn)
+        if (a_id, isbn) in pairs:
+            report.add('book_authors', n, 'duplicate_pk', "duplicate (Author_id, Isbn)", f"{a_id},{isbn}")
+        pairs.add((a_id, isbn))
+
+
+# Normalized (Card_id, Ssn, Bname, Address, Phone) and raw (ID0000id, ssn, ...,
+# email, phone) borrowers files share the same checks.
+BORROWER_COLUMNS = {
+    'Card_id': ('Card_id', 'Ssn', 'Phone', None),
+    'ID0000id': ('ID0000id', 'ssn', 'phone', 'email'),
+}
+
+
+def validate_borrowers(path, report):
+    card_ids, ssns = set(), set()
+    columns = None
+    for n, row in rows(path):
+        report.rows['borrowers'] += 1
+        if columns is None:
+            # Header problems are reported once (as row 0) instead of per row
+            columns = next((cols for key, cols in BORROWER_COLUMNS.items() if key in row), None)
+            if columns is None:
+                report.add('borrowers', 0, 'missing_column', "no Card_id or ID0000id column",
+                           ",".join(row))
+                return
+            missing = [col for col in columns if col and col not in row]
+            for col in missing:
+                report.add('borrowers', 0, 'missing_column', "missing column", col)
+            if missing:
+                return
+        card_col, ssn_col, phone_col, email_col = columns
+        cid = row[card_col].strip()
+        ssn = re.sub(r"\D", "", row[ssn_col] or "")
+        phone = re.sub(r"\D", "", row[phone_col] or "")
+
+        if not cid:
+            report.add('borrowers', n, 'missing_pk', "missing card id", cid)
+        elif cid in card_ids:
+            report.add('borrowers', n, 'duplicate_pk', "duplicate card id", cid)
+        if ssn and not SSN.match(ssn):
+            report.add('borrowers', n, 'ssn_format', "invalid SSN", row[ssn_col])
+        if ssn and ssn in ssns:
+            report.add('borrowers', n, 'duplicate_ssn', "SSN already used", row[ssn_col])
+        if phone and not PHONE.match(phone):
+            report.add('borrowers', n, 'phone_format', "invalid phone number", row[phone_col])
+        if email_col and '@' not in (row[email_col] or ''):
+            report.add('borrowers', n, 'email_format', "invalid email address", row[email_col])
+
+        card_ids.add(cid)
+        if ssn:
+            ssns.add(ssn)
+
+
+def validate_catalog(books, authors, bookauthors, report=None):
+    report = report or ValidationReport()
+    isbns, author_ids = set(), set()
+    validate_books(books, report, isbns)
+    validate_authors(authors, report, author_ids)
+    validate_book_authors(bookauthors, report, isbns, author_ids)
+    return report
+
+
+if __name__ == "__main__":
+    import sys
+
+    report = validate_catalog('../normalized_data/normalized_book.csv',
+                              '../normalized_data/normalized_authors.csv',
+                              '../normalized_data/normalized_book_authors.csv')
+    validate_borrowers('../normalized_data/normalized_borrowers.csv', report)
+    report.print()
+    sys.exit(0 if report.ok else 1)